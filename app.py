@@ -1,9 +1,11 @@
 """"
 Main app script
 
+searches are limited by a SearchBudget: the first solve by the node limit of the solver (MAX_ITERS of its module),
+solving again after the user changed the grid (enter, see Solver.resolve) by RESOLVE_TIME seconds, returning the best
+grid found so far when the budget runs out
 
 TODO:
- - allow MAX_ITERS to be changed for both searches
  - review clue model classes, update (make upper case)
  - add box coloring option to board GUI
  - work on BERT model (first in isolation, then use with solver)
@@ -24,7 +26,8 @@ logging.basicConfig()
 log.setLevel(logging.DEBUG)
 
 from utils.utils import open_file, dialogbox, yesno_dialog
-from solvers import BacktrackSolver, PrioritySolver
+from solvers import BacktrackSolver, PrioritySolver, PortfolioSolver
+from solvers.budget import SearchBudget
 from utils.board_gui import BoardGUI
 
 DisplayData = namedtuple('DisplayData', ['CLUE_HEIGHT',
@@ -39,6 +42,8 @@ DisplayData = namedtuple('DisplayData', ['CLUE_HEIGHT',
                                        'CLUE_NUM_FONT'])
 
 PUZ_DIR = './data/puzzles/'
+# seconds allowed to solve again after the user changed the grid (by pressing enter)
+RESOLVE_TIME = 1.
 
 def main():
 
@@ -55,23 +60,28 @@ def main():
     # ask user whether generate (partial) solution
     get_sol = yesno_dialog("Find Solution?", "Do you want to automatically find the solution?")
     if get_sol and any([c not in ['.', '-'] for c in p.fill]):
-        get_sol = yesno_dialog("Find Solution?", "Puzzle is not empty, finding solution will overwrite puzzle data.  Proceed anyway?")
+        keep = yesno_dialog("Find Solution?", "Puzzle is not empty.  Keep the letters already in the grid?  Otherwise they will be cleared.")
+        if not keep:
+            p.fill = ''.join([c if c in ['.', '-'] else '-' for c in p.fill])
 
+    solver = None
     if get_sol:
-        # make sure p is empty
-        p.fill = [c if c in ['.', '-'] else '-' for c in p.fill]
-
         # ask user to choose clue model and solver
-        d1 = dialogbox("Clue model?", "Which clue model do you want to use?", o1='Oracle', o2='Web')
-        d2 = dialogbox("Solver?", "Which solver do you want to use?", o1='Backtracking', o2='Priority Search')
-        clue_solver = ["oracle", "web"][d1]
+        d1 = dialogbox("Clue model?", "Which clue model do you want to use?", o1='Oracle', o2='Web', o3='BERT')
+        d2 = dialogbox("Solver?", "Which solver do you want to use?", o1='Backtracking', o2='Priority Search', o3='Portfolio (all in parallel)')
+        clue_solver = ["oracle", "web", "bert"][d1]
         solver = [BacktrackSolver(clue_model_type=clue_solver, puz_name=puz_name),
-                  PrioritySolver(clue_model_type=clue_solver, puz_name=puz_name)][d2]
+                  PrioritySolver(clue_model_type=clue_solver, puz_name=puz_name),
+                  PortfolioSolver(clue_model_type=clue_solver, puz_name=puz_name)][d2]
 
         sol, clue_model = solver.solve_puz(p)
-        print("\nsolution:")
-        board = sol.grid
         candidates = clue_model.candidates
+        if sol is not None:
+            print("\nsolution:")
+            board = sol.grid
+        else:
+            print("\nno solution found")
+            board = None
     else:
         board, candidates = None, None
 
@@ -87,6 +97,7 @@ def main():
                              GRID_FONT = pg.font.Font(None, 50),
                              CLUE_FONT = pg.font.Font(None, 30),
                              CLUE_NUM_FONT = pg.font.Font(None, 16))
+    # after changing cells, press enter to solve again keeping the letters filled in by the user
     screen = pg.display.set_mode((900, 900 + 2 * board_data.CLUE_HEIGHT))
     pg.display.set_caption('"' + p.title + '" ' + p.author)
     board = BoardGUI(screen, p, board=board, candidates=candidates, board_data=board_data)
@@ -99,6 +110,10 @@ def main():
             if event.type == pg.QUIT:
                 done = True
             board.handle_event(event)
+            if event.type == pg.KEYDOWN and event.key == pg.K_RETURN and solver is not None:
+                sol, _ = solver.resolve(board.user_fill(), budget=SearchBudget(time_limit=RESOLVE_TIME))
+                if sol is not None:
+                    board.set_board(sol.grid)
 
         screen.fill(board_data.COLOR_BORDER)
         board.draw(screen)
@@ -0,0 +1,241 @@
+"""
+SOLVER BENCHMARK:
+
+runs the solvers on synthetic puzzles of increasing size with oracle candidates, to catch performance regressions
+
+    - puzzles are generated from a seed: random symmetric black squares (every white cell lies on an across and
+      a down entry), filled with random letters, so results are reproducible between commits
+    - each case (solver, size, candidates per entry, noise, seed) runs in a fresh process, so peak RSS is per case
+    - noise is the probability that the correct answer is missing from the candidate list of an entry
+
+for each case we record:
+    nodes_per_sec: search nodes (iterations of the solver main loop) per second of search, ie not counting setup
+    time_to_fill: seconds from start of solve until the first complete grid (every entry placed or excluded),
+                  None if none found
+    peak_rss_mb: peak resident memory of the process running the case
+    quality: number of excluded entries, empty cells, fraction of cells filled correctly, whether grid is solved
+
+results are written as json, and can be compared with an earlier run:
+
+    python -m benchmarks.solver_benchmark --output new.json
+    python -m benchmarks.solver_benchmark --output new.json --compare old.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout, redirect_stderr
+from itertools import product
+
+try:
+    import resource
+except ImportError:  # not available on windows, peak memory is then not recorded
+    resource = None
+
+import puz
+
+SIZES = [5, 9, 13, 17, 21]
+NUM_CANDIDATES = [5, 10]
+NOISE = [0., 0.1]
+SEEDS = [0]
+SOLVERS = ['backtrack', 'priority', 'local']
+TIME_LIMIT = 10
+BLACK_FRACTION = 0.15
+
+
+def make_puzzle(size, seed=0, black_fraction=BLACK_FRACTION):
+    """
+    returns puz.Puzzle of given size with a random (symmetric) grid and random letters as solution
+    """
+    rng = random.Random(seed)
+    grid = [['-'] * size for _ in range(size)]
+    for r, c in product(range(size), range(size)):
+        if rng.random() < black_fraction / 2:
+            grid[r][c] = grid[size - 1 - r][size - 1 - c] = '.'
+
+    # black out cells that are not part of both an across and a down entry, until there are none left
+    changed = True
+    while changed:
+        changed = False
+        for r, c in product(range(size), range(size)):
+            if grid[r][c] == '.':
+                continue
+            across = (c > 0 and grid[r][c - 1] != '.') or (c < size - 1 and grid[r][c + 1] != '.')
+            down = (r > 0 and grid[r - 1][c] != '.') or (r < size - 1 and grid[r + 1][c] != '.')
+            if not (across and down):
+                grid[r][c] = '.'
+                changed = True
+
+    p = puz.Puzzle()
+    p.width = p.height = size
+    p.fill = ''.join(''.join(row) for row in grid)
+    p.solution = ''.join(c if c == '.' else rng.choice(string.ascii_uppercase) for c in p.fill)
+    numbering = puz.DefaultClueNumbering(p.fill, [''] * (2 * size * size), size, size)
+    p.clues = [f'clue {i}' for i in range(len(numbering.across) + len(numbering.down))]
+    return p
+
+
+def run_case(solver_name, size, num_candidates, noise, seed, time_limit):
+    """
+    runs a single case in the current process, returns dict of results
+    """
+    import numpy as np
+    import clue_models.base_clue_solver as base_clue_solver
+    from solvers import BacktrackSolver, PrioritySolver, LocalSearchSolver
+    from solvers.budget import SearchBudget
+
+    solver_class = {'backtrack': BacktrackSolver, 'priority': PrioritySolver, 'local': LocalSearchSolver}[solver_name]
+    p = make_puzzle(size, seed)
+    np.random.seed(seed)
+
+    fill_times = []
+
+    def on_improved(grid_state):
+        if not fill_times and grid_state.is_complete:
+            fill_times.append(budget.elapsed)
+
+    budget = SearchBudget(time_limit=time_limit, on_improved=on_improved)
+    solver = solver_class(clue_model_type='oracle', load_candidates=False, puz_name=f'benchmark_{size}_{seed}',
+                          clue_model_kwargs={'num_candidates_per_entry': num_candidates, 'noise': noise})
+
+    # time search on its own, without generating candidates and building the initial grid state
+    search_times = []
+    search = solver._solver
+
+    def timed_search(initial_grid_state):
+        start = time.time()
+        try:
+            return search(initial_grid_state)
+        finally:
+            search_times.append(time.time() - start)
+    solver._solver = timed_search
+
+    # keep generated candidates out of the data folder, and solver progress output out of the results
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, 'w') as devnull, \
+            redirect_stdout(devnull), redirect_stderr(devnull):
+        base_clue_solver.CANDIDATES_PATH = tmp_dir + '/'
+        sol, _ = solver.solve_puz(p, budget=budget)
+    elapsed, search_time = budget.elapsed, search_times[0]
+    if not fill_times and sol is not None and sol.is_complete:
+        # complete grid that was returned without being reported
+        fill_times.append(elapsed)
+
+    result = {'solver': solver_name, 'size': size, 'num_candidates': num_candidates, 'noise': noise, 'seed': seed,
+              'time': elapsed, 'search_time': search_time, 'nodes': budget.nodes,
+              'nodes_per_sec': budget.nodes / search_time if search_time else None,
+              'time_to_fill': fill_times[0] if fill_times else None, 'stop_reason': budget.reason,
+              'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 if resource else None}
+
+    if sol is None:
+        result.update({'num_excluded': None, 'num_empty': None, 'correct_fraction': 0., 'solved': False})
+    else:
+        fill = [c for row in sol.grid for c in row]
+        white = [i for i, c in enumerate(p.solution) if c != '.']
+        correct = sum(fill[i].upper() == p.solution[i] for i in white)
+        result.update({'num_excluded': sol.num_excluded, 'num_empty': sol.num_empty,
+                       'correct_fraction': correct / len(white), 'solved': correct == len(white)})
+    return result
+
+
+def _run_case_in_process(args, results):
+    results.put(run_case(*args))
+
+
+def run_benchmark(solvers=SOLVERS, sizes=SIZES, num_candidates=NUM_CANDIDATES, noise=NOISE, seeds=SEEDS,
+                  time_limit=TIME_LIMIT):
+    """
+    runs every combination of settings, each in a fresh process, returns list of results
+    """
+    ctx = mp.get_context('spawn')
+    results = []
+    for args in product(solvers, sizes, num_candidates, noise, seeds):
+        queue = ctx.Queue()
+        process = ctx.Process(target=_run_case_in_process, args=(args + (time_limit,), queue))
+        process.start()
+        try:
+            # allow for startup and candidate generation on top of the time limit
+            result = queue.get(timeout=2 * time_limit + 60)
+        except Exception as e:
+            result = dict(zip(['solver', 'size', 'num_candidates', 'noise', 'seed'], args), error=repr(e))
+        process.join(timeout=1)
+        if process.is_alive():
+            process.terminate()
+        results.append(result)
+        print(format_result(result), flush=True)
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def _key(result):
+    return tuple(result[k] for k in ['solver', 'size', 'num_candidates', 'noise', 'seed'])
+
+
+def _fmt(value, spec):
+    return format(value, spec) if value is not None else '-'
+
+
+def format_result(result):
+    name = '{:>9} size={:<2} cands={:<2} noise={:<4} seed={}'.format(*_key(result))
+    if 'error' in result:
+        return f"{name}  ERROR {result['error']}"
+    return (f"{name}  {_fmt(result['nodes_per_sec'], '9.0f')} nodes/s  fill {_fmt(result['time_to_fill'], '6.2f')}s  "
+            f"rss {_fmt(result['peak_rss_mb'], '6.1f')}MB  excluded {_fmt(result['num_excluded'], '3d')}  "
+            f"correct {result['correct_fraction']:.2f}")
+
+
+def compare(results, baseline):
+    """
+    prints ratio of nodes/sec and time to first fill of each case to the matching case of baseline results
+    """
+    baseline = {_key(result): result for result in baseline if 'error' not in result}
+    print("\ncomparison with baseline (nodes/sec ratio > 1 and fill time ratio < 1 are improvements):")
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None or 'error' in result:
+            continue
+        speed = result['nodes_per_sec'] / old['nodes_per_sec'] if result['nodes_per_sec'] and old['nodes_per_sec'] else None
+        fill = result['time_to_fill'] / old['time_to_fill'] if result['time_to_fill'] and old['time_to_fill'] else None
+        quality = result['correct_fraction'] - old['correct_fraction']
+        print('{:>9} size={:<2} cands={:<2} noise={:<4} seed={}'.format(*_key(result)) +
+              f"  nodes/s x{_fmt(speed, '.2f')}  fill x{_fmt(fill, '.2f')}  correct {quality:+.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark crossword solvers on synthetic puzzles")
+    parser.add_argument('--solvers', nargs='+', default=SOLVERS, choices=SOLVERS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument('--num-candidates', nargs='+', type=int, default=NUM_CANDIDATES)
+    parser.add_argument('--noise', nargs='+', type=float, default=NOISE)
+    parser.add_argument('--seeds', nargs='+', type=int, default=SEEDS)
+    parser.add_argument('--time-limit', type=float, default=TIME_LIMIT, help="seconds per case")
+    parser.add_argument('--output', help="json file to write results to")
+    parser.add_argument('--compare', help="json file of an earlier run to compare with")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.solvers, args.sizes, args.num_candidates, args.noise, args.seeds, args.time_limit)
+    report = {'commit': _git_commit(), 'python': sys.version.split()[0], 'platform': platform.platform(),
+              'cpu_count': os.cpu_count(), 'time_limit': args.time_limit, 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f)['results'])
+
+
+if __name__ == '__main__':
+    main()
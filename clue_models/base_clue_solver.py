@@ -5,6 +5,9 @@ import os
 import logging
 log = logging.getLogger("crossword_logger")
 
+from clue_models.candidate_store import CandidateStore
+from clue_models.clue_cache import ClueCache
+
 CANDIDATES_PATH = os.path.dirname(os.path.abspath(__file__)) + '/../data/candidates/'
 
 
@@ -16,41 +19,106 @@ class ClueSolver:
     DEFAULT_NUM_CANDIDATES_PER_ENTRY = 5
     MODEL_NAME = 'base'
     ERROR = 'ERROR'
+    # whether answers depend only on the clue and length, so they can be shared between puzzles (see clue_cache.py)
+    USE_CACHE = True
 
-    def __init__(self, num_candidates_per_entry=None, load=True, save=False):
+    def __init__(self, num_candidates_per_entry=None, load=True, cache=None):
+        """
+        load: use candidates found before, from the candidate store of the puzzle and the clue cache
+        cache: ClueCache looked up before finding a clue (None = shared cache if USE_CACHE, False = no cache)
+               not used without load
+        """
         self.num_candidates_per_entry = self.DEFAULT_NUM_CANDIDATES_PER_ENTRY if num_candidates_per_entry is None else num_candidates_per_entry
         self.load = load
-        self.save = save
+        # only a cache opened here is closed by close()
+        self.own_cache = cache is None
+        if not load:
+            self.cache = None
+        elif cache is None:
+            self.cache = ClueCache() if self.USE_CACHE else None
+        else:
+            self.cache = cache or None
+        # names the answers of this model in the clue cache and candidate store files, child classes whose answers
+        # depend on their configuration (eg the weights loaded) must add it to the key
+        self.model_key = self.MODEL_NAME
         self.candidates = {}
 
     def generate_candidates(self, entries, puzname):
+        """
+        finds candidates of each entry, stored by entry index in self.candidates (in order of the entries)
+        candidates are kept in a CandidateStore per puzzle and model: with load, stored entries are not looked up
+        again, and every entry looked up is appended to the store (errors are not stored, so are tried again)
+        """
+        cand_file_path = CANDIDATES_PATH + puzname + '_' + self.model_key
+        store = CandidateStore(cand_file_path + '.cands')
+        if self.load and not len(store) and os.path.exists(cand_file_path):
+            self._import_pickle(cand_file_path, store)
+
+        log.info("creating candidates...")
+        missing = [idx for idx in range(len(entries)) if not self.load or idx not in store]
+        found = dict(zip(missing, self._find_clues_cached([entries[idx] for idx in missing]))) if missing else {}
+        store.put_many([(idx, cands) for idx, cands in found.items() if cands != self.ERROR])
+
+        # errors are replaced by empty lists, so algorithm will run
         self.candidates = {}
-        cand_file_path = CANDIDATES_PATH + puzname + '_' + self.MODEL_NAME
+        for idx in range(len(entries)):
+            cands = found[idx] if idx in found else store.get(idx)
+            self.candidates[idx] = [] if cands == self.ERROR else cands
+        store.close()
+
+    def _import_pickle(self, cand_file_path, store):
+        """
+        moves candidates saved by earlier versions (pickle of the whole candidates dict) to store
+        """
+        log.info("importing candidates from pickle...")
+        with open(cand_file_path, 'rb') as f:
+            candidates = pickle.load(f)
+        store.put_many([(idx, cands) for idx, cands in candidates.items() if type(cands) is list])
+
+    def _find_clues_cached(self, entries):
+        """
+        find_clues, looking up entries in the cache first and storing the new answers in it
+        """
+        if self.cache is None:
+            return self.find_clues(entries)
+
+        found = self.cache.get(self.model_key, entries, self.num_candidates_per_entry)
+        todo = [i for i, cands in enumerate(found) if cands is None]
+        if todo:
+            new = self.find_clues([entries[i] for i in todo])
+            for i, cands in zip(todo, new):
+                found[i] = cands
+            # errors are looked up again next time
+            ok = [(entries[i], cands) for i, cands in zip(todo, new) if cands != self.ERROR]
+            if ok:
+                self.cache.put(self.model_key, [entry for entry, _ in ok], [cands for _, cands in ok],
+                               self.num_candidates_per_entry)
+        return found
+
+    def close(self):
+        """
+        closes the clue cache opened by this model, candidates already found stay available
+        """
+        if self.own_cache and self.cache is not None:
+            self.cache.close()
+        self.cache = None
 
-        if self.load and os.path.exists(cand_file_path):
-            log.info("loading candidates...")
-            with open(cand_file_path, 'rb') as f:
-                self.candidates = pickle.load(f)
+    def __enter__(self):
+        return self
 
-        log.debug(f"got here with candidates = {self.candidates}")
-        log.info("creating candidates...")
-        for idx, entry in tqdm(enumerate(entries)):
-            if not self.load or idx not in self.candidates or type(self.candidates[idx]) is not list:
-                self.candidates[idx] = self.find_clue(entry)
-                self.save = True # force save if updating any elements TODO: better way?
-        if self.save:
-            log.info("saving candidates...")
-            with open(cand_file_path, 'wb') as f:
-                pickle.dump(self.candidates, f, pickle.HIGHEST_PROTOCOL)
-
-        # finally, replace all errors by empty lists, so algorithm will run
-        for idx in self.candidates:
-            if self.candidates[idx] == self.ERROR:
-                self.candidates[idx] = []
+    def __exit__(self, *exc):
+        self.close()
 
     def __call__(self, entry):
         return self.find_clue(entry)
 
+    def find_clues(self, entries):
+        """
+        returns list of candidate lists, one for each entry (see find_clue)
+        child classes can override this to look up several clues at once
+        """
+        return [self.find_clue(entry) for entry in tqdm(entries)]
+
     def find_clue(self, entry):
         """
         to be implemented in child classes
@@ -1,18 +1,96 @@
+import hashlib
+import os
+import re
+
 import logging
 log = logging.getLogger("crossword_logger")
 
 from clue_models.base_clue_solver import ClueSolver
+from utils.constants import JOIN_STRING
 
 
 class BERTSolver(ClueSolver):
     """
     solver based on BERT model
     model defined in 'clue_net.py'
+
+    the model is trained on '<answer> is the answer to: <clue>' and predicts the answer token at position 1, so the
+    answer is masked out to query it.  all clues of a puzzle are answered together (see find_clues):
+        - clues are tokenized once, sorted by number of tokens and cut into batches of batch_size, so each batch is
+          only padded up to its own longest clue
+        - batches run on cpu under torch.inference_mode, using num_threads threads for each operation
+        - only answers of the length of the entry are scored, from an index of the answers of the training set
+          grouped by length (see clue_net.make_answer_index), so every candidate fits the grid
     """
     MODEL_NAME = 'bert'
 
-    def __init__(self):
-        super().__init__()
-        self.model = None
-        # TODO: create and train (or load pretrained) Bert model and add here
+    DEFAULT_MODEL = 'bert-base-uncased'
+    BATCH_SIZE = 64
+
+    def __init__(self, entries, puzname, num_candidates_per_entry=None, load=True, cache=None,
+                 checkpoint=None, model_name=DEFAULT_MODEL, batch_size=BATCH_SIZE, num_threads=None):
+        """
+        checkpoint: trained CrosswordSolver checkpoint (None = pretrained model_name only)
+        model_name: pretrained BERT model and tokenizer
+        batch_size: number of clues per forward pass
+        num_threads: number of intra-op threads of torch (None = torch default)
+        """
+        super().__init__(num_candidates_per_entry=num_candidates_per_entry, load=load, cache=cache)
+        self.model_key = self._model_key(model_name, checkpoint)
+        # torch and transformers are only needed for this model
+        import torch as th
+        import transformers
+        from clue_models.clue_net import CrosswordSolver, load_answer_index, top_k_answers
+
+        self.th = th
+        self.top_k_answers = top_k_answers
+        self.batch_size = batch_size
+        self.join_string = JOIN_STRING
+        if num_threads is not None:
+            th.set_num_threads(num_threads)
+
+        self.tokenizer = transformers.BertTokenizer.from_pretrained(model_name)
+        self.answer_index = load_answer_index(self.tokenizer)
+        if checkpoint is None:
+            self.model = CrosswordSolver(model_name=model_name)
+        else:
+            self.model = CrosswordSolver.load_from_checkpoint(checkpoint, model_name=model_name, map_location='cpu')
+        self.model.eval()
+        self.generate_candidates(entries, puzname)
+
+    def _model_key(self, model_name, checkpoint):
+        """
+        answers depend on the pretrained model and the checkpoint loaded, so both are part of the key
+        the checkpoint is identified by its path and modification time, so retraining to the same path changes the key
+        """
+        key = self.MODEL_NAME + '_' + re.sub(r'[^\w.-]', '-', model_name)
+        if checkpoint is not None:
+            path = os.path.abspath(checkpoint)
+            key += '_' + hashlib.sha1(f'{path}:{os.path.getmtime(path)}'.encode()).hexdigest()[:12]
+        return key
+
+    def find_clue(self, entry):
+        return self.find_clues([entry])[0]
+
+    def find_clues(self, entries):
+        th = self.th
+        tokenizer = self.tokenizer
+        texts = [tokenizer.mask_token + self.join_string + entry['clue'] for entry in entries]
+        token_ids = [tokenizer.encode(text) for text in texts]
 
+        # length buckets: batches of clues with similar numbers of tokens
+        order = sorted(range(len(entries)), key=lambda i: len(token_ids[i]))
+        out = [None] * len(entries)
+        with th.inference_mode():
+            for start in range(0, len(order), self.batch_size):
+                batch = order[start:start + self.batch_size]
+                max_len = max(len(token_ids[i]) for i in batch)
+                input_ids = th.full((len(batch), max_len), tokenizer.pad_token_id, dtype=th.long)
+                for row, i in enumerate(batch):
+                    input_ids[row, :len(token_ids[i])] = th.tensor(token_ids[i])
+                logits = self.model(input_ids)
+                top = self.top_k_answers(logits, [entries[i]['length'] for i in batch], self.num_candidates_per_entry,
+                                         self.answer_index)
+                for row, i in enumerate(batch):
+                    out[i] = self.tokenizer.convert_ids_to_tokens(top[row])
+        return out
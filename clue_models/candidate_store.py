@@ -0,0 +1,139 @@
+"""
+append-only store of the candidates of each entry of a puzzle, replacing the pickle of the whole candidates dict
+
+the file is a sequence of records, one per update of an entry: a header (entry index, number of candidates, length
+of data, crc32) followed by the candidates, utf-8 encoded and separated by newlines.  the last record of an entry wins
+    - updating an entry appends a single record, so costs O(1) I/O whatever the number of entries
+    - opening the store memory-maps the file and only reads the headers to build an index of the latest record of
+      each entry, candidates are decoded when asked for (no python objects are unpickled)
+    - a record is only valid if it is complete and its crc matches, so a write torn by a crash is detected on the
+      next open and cut off, and the records before it are kept
+    - once most records are superseded, the file is rewritten with the latest record of each entry and atomically
+      replaced
+"""
+import mmap
+import os
+import struct
+import zlib
+
+import logging
+log = logging.getLogger("crossword_logger")
+
+# entry index, number of candidates, length of data, crc32 of the rest of the header and the data
+HEADER = struct.Struct('<IIII')
+SEPARATOR = b'\n'
+# rewrite the file if it has more than this many records per entry, and at least MIN_COMPACT_RECORDS records
+COMPACT_RATIO = 2
+MIN_COMPACT_RECORDS = 1000
+
+
+def _record(idx, cands):
+    data = SEPARATOR.join(word.encode('utf-8') for word in cands)
+    crc = zlib.crc32(data, zlib.crc32(HEADER.pack(idx, len(cands), len(data), 0)))
+    return HEADER.pack(idx, len(cands), len(data), crc) + data
+
+
+class CandidateStore:
+    def __init__(self, path):
+        """
+        opens store at path, creating it if missing
+        """
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # index: entry index -> (offset of data, number of candidates, length of data) of latest record
+        self.index = {}
+        self.num_records = 0
+        self.mm = None
+        self.f = open(path, 'a+b')
+        self._load()
+        if self.num_records > COMPACT_RATIO * len(self.index) and self.num_records >= MIN_COMPACT_RECORDS:
+            self.compact()
+
+    def _load(self):
+        """
+        maps the file and indexes its valid records, cutting off a torn record at the end
+        """
+        self.index, self.num_records = {}, 0
+        size = os.fstat(self.f.fileno()).st_size
+        if size == 0:
+            return
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        while offset + HEADER.size <= size:
+            idx, count, length, crc = HEADER.unpack_from(self.mm, offset)
+            start = offset + HEADER.size
+            if start + length > size or \
+                    zlib.crc32(self.mm[start:start + length], zlib.crc32(HEADER.pack(idx, count, length, 0))) != crc:
+                break
+            self.index[idx] = (start, count, length)
+            self.num_records += 1
+            offset = start + length
+
+        if offset < size:
+            log.info(f"candidate store {self.path}: dropping {size - offset} bytes of incomplete record")
+            self.mm.close()
+            self.f.truncate(offset)
+            self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ) if offset else None
+
+    def __contains__(self, idx):
+        return idx in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, idx):
+        """
+        returns list of candidates of entry idx (KeyError if not stored)
+        """
+        start, count, length = self.index[idx]
+        if count == 0:
+            return []
+        if self.mm is None or start + length > len(self.mm):
+            # appended since the file was mapped
+            self._remap()
+        return self.mm[start:start + length].decode('utf-8').split(SEPARATOR.decode())
+
+    def put(self, idx, cands):
+        self.put_many([(idx, cands)])
+
+    def put_many(self, items):
+        """
+        appends a record for each (entry index, list of candidates), and syncs them to disk
+        """
+        offset = self.f.seek(0, os.SEEK_END)
+        records = []
+        for idx, cands in items:
+            record = _record(idx, cands)
+            self.index[idx] = (offset + HEADER.size, len(cands), len(record) - HEADER.size)
+            offset += len(record)
+            records.append(record)
+        self.f.write(b''.join(records))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.num_records += len(records)
+
+    def compact(self):
+        """
+        rewrites file with only the latest record of each entry, replacing it atomically
+        """
+        items = [(idx, self.get(idx)) for idx in sorted(self.index)]
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(b''.join(_record(idx, cands) for idx, cands in items))
+            f.flush()
+            os.fsync(f.fileno())
+        self.close()
+        os.replace(tmp_path, self.path)
+        self.f = open(self.path, 'a+b')
+        self._load()
+
+    def _remap(self):
+        if self.mm is not None:
+            self.mm.close()
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        self.f.close()
@@ -0,0 +1,137 @@
+"""
+cache of candidates shared between puzzles, so that a clue seen before (eg "Actress Thurman", 4 letters) is not
+looked up or inferred again
+
+stored in an SQLite database in WAL mode, so any number of processes can read while one writes
+rows are keyed by clue model, normalized clue text and answer length, and expire after ttl seconds; once there are
+more than max_entries rows, the least recently used ones are evicted
+
+writes take the database lock, so the hot paths avoid them: a hit only updates the last use of its row if it is more
+than TOUCH_INTERVAL seconds old (so LRU order is only this precise), and expired and surplus rows are only evicted on
+the first put and then every evict_interval rows put (so the cache can hold up to evict_interval rows too many)
+"""
+import json
+import os
+import sqlite3
+import time
+import unicodedata
+
+import logging
+log = logging.getLogger("crossword_logger")
+
+CACHE_PATH = os.path.dirname(os.path.abspath(__file__)) + '/../data/clue_cache.sqlite'
+TTL = 90 * 24 * 3600
+MAX_ENTRIES = 1000000
+# seconds to wait for a lock held by another process
+BUSY_TIMEOUT = 30
+# sqlite limits the number of parameters of a query
+BATCH_SIZE = 200
+# seconds between updates of the last use of a row
+TOUCH_INTERVAL = 3600
+# number of rows put between evictions
+EVICT_INTERVAL = 1000
+
+
+def normalize_clue(clue):
+    """
+    case, unicode forms and runs of whitespace do not change the answer, punctuation can ("?" marks wordplay)
+    """
+    return ' '.join(unicodedata.normalize('NFKC', clue).lower().split())
+
+
+class ClueCache:
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_entries=MAX_ENTRIES, evict_interval=EVICT_INTERVAL):
+        """
+        path: sqlite database file, created if missing
+        ttl: seconds before a cached answer expires (None = never)
+        max_entries: number of rows kept, least recently used rows beyond this are evicted (None = no limit)
+        evict_interval: number of rows put between evictions
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        # rows put since the last eviction, starts full so the first put evicts
+        self.num_put = evict_interval
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # autocommit, transactions are opened explicitly
+        self.conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS clues (model TEXT, clue TEXT, length INTEGER, '
+                          'num_candidates INTEGER, candidates TEXT, created REAL, last_used REAL, '
+                          'PRIMARY KEY (model, clue, length)) WITHOUT ROWID')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS clues_last_used ON clues (last_used)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS clues_created ON clues (created)')
+
+    def get(self, model, entries, num_candidates):
+        """
+        returns list with the cached candidates of each entry (see ClueSolver.find_clue), None if not cached,
+        expired, or cached with fewer than num_candidates candidates asked for
+        """
+        now = time.time()
+        min_created = -1 if self.ttl is None else now - self.ttl
+        keys = [(normalize_clue(entry['clue']), entry['length']) for entry in entries]
+        found = {}
+        stale = []  # hits whose last use is too old to keep their place in the LRU order
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), BATCH_SIZE):
+            batch = unique_keys[start:start + BATCH_SIZE]
+            rows = self.conn.execute(
+                'SELECT clue, length, candidates, last_used FROM clues WHERE model = ? AND num_candidates >= ? '
+                'AND created > ? AND (clue, length) IN (VALUES ' + ', '.join(['(?, ?)'] * len(batch)) + ')',
+                [model, num_candidates, min_created] + [x for key in batch for x in key])
+            for clue, length, candidates, last_used in rows:
+                found[(clue, length)] = json.loads(candidates)[:num_candidates]
+                if last_used < now - TOUCH_INTERVAL:
+                    stale.append((clue, length))
+
+        if stale:
+            self._write('UPDATE clues SET last_used = ? WHERE model = ? AND clue = ? AND length = ?',
+                        [(now, model) + key for key in stale])
+        log.info(f"clue cache: {sum(key in found for key in keys)}/{len(keys)} hits")
+        return [found.get(key) for key in keys]
+
+    def put(self, model, entries, candidates, num_candidates):
+        """
+        stores candidates (one list per entry) found asking for num_candidates candidates per entry
+        """
+        now = time.time()
+        rows = [(model, normalize_clue(entry['clue']), entry['length'], num_candidates, json.dumps(cands), now, now)
+                for entry, cands in zip(entries, candidates)]
+        self.num_put += len(rows)
+        evict = self.num_put >= self.evict_interval
+        if self._write('INSERT OR REPLACE INTO clues VALUES (?, ?, ?, ?, ?, ?, ?)', rows, evict=evict) and evict:
+            self.num_put = 0
+
+    def _write(self, sql, rows, evict=False):
+        """
+        returns whether the write was committed
+        """
+        # BEGIN IMMEDIATE takes the write lock up front, so concurrent writers wait (up to BUSY_TIMEOUT) instead of
+        # failing when a read transaction cannot be upgraded
+        try:
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(sql, rows)
+            if evict:
+                self._evict()
+            self.conn.execute('COMMIT')
+            return True
+        except sqlite3.Error as e:
+            if self.conn.in_transaction:
+                self.conn.execute('ROLLBACK')
+            # the cache only saves time, a failed write is not an error of the clue model
+            log.info(f"clue cache write failed: {e}")
+            return False
+
+    def _evict(self):
+        if self.ttl is not None:
+            self.conn.execute('DELETE FROM clues WHERE created <= ?', (time.time() - self.ttl,))
+        if self.max_entries is not None:
+            (count,) = self.conn.execute('SELECT COUNT(*) FROM clues').fetchone()
+            if count > self.max_entries:
+                self.conn.execute('DELETE FROM clues WHERE (model, clue, length) IN (SELECT model, clue, length '
+                                  'FROM clues ORDER BY last_used LIMIT ?)', (count - self.max_entries,))
+
+    def close(self):
+        self.conn.close()
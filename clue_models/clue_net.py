@@ -7,6 +7,9 @@ Neural network based crossword solver using BERT
 #  - better way to set up model?
 #  - train on GPU
 
+from collections import defaultdict
+import os
+
 from absl import app, flags, logging
 
 import torch as th
@@ -28,11 +31,63 @@ flags.DEFINE_integer('seq_length', 32, '')
 
 FLAGS = flags.FLAGS
 
+TRAIN_PATH = './data/clues_train.csv'
+TEST_PATH = './data/clues_test.csv'
+
+
+def make_answer_index(tokenizer, answers=None):
+    """
+    answers that are a single token of the vocabulary, grouped by length: dict length -> tensor of token ids
+    answers: answer strings, eg those of the training set (None = every alphabetic whole-word token)
+    """
+    vocab = tokenizer.get_vocab()
+    if answers is None:
+        answers = [token for token in vocab if token.isalpha()]
+    by_length = defaultdict(set)
+    for answer in answers:
+        answer = str(answer).lower()
+        if answer in vocab:
+            by_length[len(answer)].add(vocab[answer])
+    return {length: th.tensor(sorted(token_ids)) for length, token_ids in by_length.items()}
+
+
+def load_answer_index(tokenizer, train_path=TRAIN_PATH):
+    """
+    answer index (see make_answer_index) of the training answers, or of the whole vocabulary if there is no training set
+    """
+    if not os.path.exists(train_path):
+        return make_answer_index(tokenizer)
+    return make_answer_index(tokenizer, pd.read_csv(train_path)['answer'].dropna())
+
+
+def top_k_answers(logits, lengths, k, answer_index):
+    """
+    best k answers of each length in lengths, only scoring the answers of that length in answer_index
+    logits: (batch, vocabulary size) output of CrosswordSolver, lengths: answer length of each row
+    returns list of token id lists, best first (fewer than k if there are not enough answers of a length)
+    """
+    out = [[] for _ in lengths]
+    rows_by_length = defaultdict(list)
+    for row, length in enumerate(lengths):
+        rows_by_length[length].append(row)
+    for length, rows in rows_by_length.items():
+        token_ids = answer_index.get(length)
+        if token_ids is None or len(token_ids) == 0:
+            continue
+        scores = logits[th.tensor(rows)][:, token_ids]
+        top = scores.topk(min(k, len(token_ids)), dim=-1).indices
+        for row, best in zip(rows, token_ids[top].tolist()):
+            out[row] = best
+    return out
+
 
 class CrosswordSolver(pl.LightningModule):
-    def __init__(self):
+    def __init__(self, model_name=None):
+        """
+        model_name: pretrained BERT model (default: --model flag, only parsed when run as a script)
+        """
         super().__init__()
-        self.model = transformers.BertForMaskedLM.from_pretrained(FLAGS.model)
+        self.model = transformers.BertForMaskedLM.from_pretrained(FLAGS.model if model_name is None else model_name)
         self.loss = th.nn.NLLLoss(reduction='none')
 
     def prepare_data(self):
@@ -50,8 +105,8 @@ class CrosswordSolver(pl.LightningModule):
 
         # don't know how to force reload here: need to delete './temp/csv' to force reload
         ds = nlp.load_dataset('csv',
-                              data_files={'train': './data/clues_train.csv',
-                                          'test': './data/clues_test.csv'},
+                              data_files={'train': TRAIN_PATH,
+                                          'test': TEST_PATH},
                               cache_dir='../temp')
         self.train_ds = ds['train'].map(_tokenize, batched=True)
         self.train_ds.set_format(type='torch', columns=['tokens', 'answer_tokens'], output_all_columns=False)
@@ -14,12 +14,17 @@ class OracleSolver(ClueSolver):
     assumes puz file comes with solution, so correct answer for each clue is known
     depending on mode, can return candidate list containing correct answer and/or several wrong answers
     used for testing solver
+
+    noise: probability that the correct answer is left out of the candidate list of an entry
     """
     MODEL_NAME = 'oracle'
+    # answers come from the solution of this puzzle
+    USE_CACHE = False
 
-    def __init__(self, p, entries, puzname, num_candidates_per_entry=None, load=True, save=False):
-        super().__init__(num_candidates_per_entry=num_candidates_per_entry, load=load, save=save)
+    def __init__(self, p, entries, puzname, num_candidates_per_entry=None, load=True, noise=0., cache=None):
+        super().__init__(num_candidates_per_entry=num_candidates_per_entry, load=load, cache=cache)
 
+        self.noise = noise
         self.solution = p.solution
         self.width = p.width
 
@@ -39,6 +44,12 @@ class OracleSolver(ClueSolver):
         cell, AD, length, _ = tuple(entry.values())
 
         answer = self.answers[(cell, AD)]
+        if self.noise and np.random.random() < self.noise:
+            # leave out correct answer, fill up with wrong answers instead
+            wrong_words = [word for word in self.answers.values() if len(word) == length and word != answer]
+            if mode == 'correct_only' or not wrong_words:
+                return []
+            return list(np.random.choice(wrong_words, self.num_candidates_per_entry))
         if mode == 'correct_only':
             return [answer]
         elif mode == 'correct_plus_random_letters':
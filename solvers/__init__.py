@@ -1,2 +1,4 @@
 from solvers.backtrack_solver import BacktrackSolver
 from solvers.priority_solver import PrioritySolver
+from solvers.portfolio_solver import PortfolioSolver
+from solvers.local_search_solver import LocalSearchSolver
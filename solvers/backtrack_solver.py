@@ -7,63 +7,510 @@ we write an algorithm A_k, below, that tries to find such a solution for a given
 then we will iterate through k, starting at zero, and find the first k for which a solution exists, and return that grid as our solution
 
 algorithm A_k:
-    - initialize stack with:
-    [ (empty grid, entry_idx_to_try = 0, cand_idx_to_try = 0)]
-    - while stack is non-empty:
-        - pop from stack
-        - go through possible entries, starting with entry_idx_to_try, cand_idx_to_try:
-            - see if fits in grid
-            - if fits in grid, see how many mistakes (must be <=k)
-        - if passes, add original grid and new grid back to queue and repeat
-    either find complete solution or stack is empty => no solution for this k
+    - start from the empty grid, with a stack of search nodes (entry being branched on, branches left to try)
+    - at each node, pick the most constrained undecided entry and branch on:
+        - each of its remaining candidates (if fits in grid, and number of excluded entries stays <= k)
+        - excluding it (if number of excluded entries stays <= k)
+    - when all branches of a node fail, backtrack (undoing the last placement)
+    either all entries are decided => solution for this k, or stack is empty => no solution for this k
+
+work is reused between passes: a node whose subtree is exhausted with a budget of b more excluded entries is
+recorded as refuted, and any later visit to the same node (same filled cells and decided entries) with a budget
+of at most b is skipped.  since each pass increases k by one, nodes reached with one more exclusion than in the
+previous pass are skipped immediately
+
+randomized restarts: with a fixed order, the search time of A_k is heavy tailed, an early bad choice can
+take most of the budget to undo.  with restarts, ties between equally constrained entries are broken at random
+(by learned weights first, if enabled), candidates are occasionally tried out of order, and the search of a pass
+starts over from its root with a new random order each time its node limit from the restart schedule
+(see restarts.py) runs out.  refuted nodes and nogoods are kept across restarts, and the limits of the luby and
+geometric schedules grow without bound, so a pass still ends with a solution or a proof that there is none.
+the run is reproducible given the seed
+
+independent regions: once enough entries are decided, the undecided entries can fall apart into regions that do not
+cross each other (eg, separate corners of the grid).  branching on them in turn would multiply their search spaces,
+so instead, as soon as a decision splits the undecided entries of the current search, each region is searched on
+its own, one after the other: the region is solved with as few excluded entries as possible (trying budgets
+0, 1, 2, ... in turn, like the passes above) and left filled in before moving on to the next one.  if some region
+cannot be completed within what is left of the budget, the node is refuted without trying any other combination
+of the regions before it.  the search time is then about the sum of the regions rather than their product.
+regions can split again further down.  a region that fails says nothing about the other regions, so refuted nodes
+and nogoods found inside a region are keyed by the region as well
 
 """
+from collections import deque, defaultdict
+import random
 import logging
 log = logging.getLogger("crossword_logger")
 
 from solvers.base_solver import Solver
+from solvers.grid_state import lowest_bit, iter_bits, popcount
+from solvers.restarts import restart_cutoffs, RESTART_BASE, RESTART_FACTOR
+from solvers.search_state import SearchState
 
 MAX_ITERS = 100000
 PRINT_FREQ = 10000
+MAX_REFUTED = 1000000
+MAX_NOGOODS = 100000
+MAX_NOGOOD_SIZE = 4
+# only the most recent nogoods containing a given decision are checked when it is made
+MAX_NOGOODS_PER_DECISION = 16
+# with restarts, probability of trying a random untried candidate of a node instead of the best one
+CANDIDATE_NOISE = 0.05
+
+# fields of a search node on the stack
+ENTRY, KEY, UNTRIED, EXCLUDE_PENDING, CONFLICT = range(5)
+
+# no entry, see _search
+_UNASSIGNED = object()
+
 
 class BacktrackSolver(Solver):
+    def __init__(self, backjump=True, restarts=None, restart_base=RESTART_BASE, restart_factor=RESTART_FACTOR, seed=0,
+                 learn_weights=False, candidate_noise=CANDIDATE_NOISE, decompose=True, **kwargs):
+        """
+        backjump: use conflict-directed backjumping and nogood learning (see _search)
+        restarts: restart schedule, 'luby' or 'geometric' (None = no restarts or randomization, see above)
+        restart_base, restart_factor: number of nodes before first restart, and growth factor of geometric schedule
+        seed: seed of random tie-breaking when restarting
+        learn_weights: count failed branches of each entry, kept across restarts and passes, and branch first on
+                       the entry that failed most often among the most constrained ones
+        candidate_noise: probability of trying a random candidate of a node first, when restarting
+        decompose: search independent regions of undecided entries separately (see above)
+        """
+        super().__init__(**kwargs)
+        self.backjump = backjump
+        self.restarts = restarts
+        self.restart_base = restart_base
+        self.restart_factor = restart_factor
+        self.seed = seed
+        self.learn_weights = learn_weights
+        self.candidate_noise = candidate_noise
+        self.decompose = decompose
+        # region being searched (list of entries, None for whole grid), and its key (see _node_key)
+        self.region = None
+        self.region_key = None
+
     def _solver(self, initial_grid_state):
+        state = SearchState(initial_grid_state)
+        max_k = self.max_excluded if self.max_excluded is not None else len(state.all_candidates)
+
+        if self.keep_learned:
+            self._reset_search()
+        else:
+            self._reset()
+        self.budget.report(state.to_grid_state())
+        for k in range(state.num_excluded, max_k + 1):
+            log.info(f"searching for solution with at most {k} excluded entries")
+            sol = self._a_k(state, k)
+            if sol is not None:
+                return sol
+            if self.budget.reason is not None:
+                return self.budget.best
+        return None
+
+    def _reset(self):
+        # tables of refuted nodes and nogoods, and number of failed branches per entry, kept across passes
+        # (and across calls to resolve that only add letters to the grid)
+        self.refuted = {}
+        self.nogoods = {}
+        self.num_nogoods = 0
+        self.weights = defaultdict(int)
+        self._reset_search()
+
+    def _reset_search(self):
+        # iteration count, and restart state: random order and node limits
+        self.iters = 0
+        self.rng = random.Random(self.seed) if self.restarts is not None else None
+        self.cutoffs = restart_cutoffs(self.restarts, self.restart_base, self.restart_factor) \
+            if self.restarts is not None else None
+        self.cutoff = None
+        self.cutoff_reached = False
+        self.num_restarts = 0
+
+    def _a_k(self, state, k):
+        """
+        runs algorithm A_k (see above) on state
+        returns solution, or None if there is no solution for this k or the search budget ran out,
+        in which case state is left at the node where the search stopped
+        """
+        # tighter budget can prune more, keep these changes on their own level of the trail
+        state.checkpoint()
+        if state.propagate(list(state.remaining_candidates), k):
+            root_depth = state.depth
+            while True:
+                if self.cutoffs is not None:
+                    self.cutoff = self.iters + next(self.cutoffs)
+                    self.cutoff_reached = False
+                sol = self._search(state, k)
+                if sol is not None or self.budget.reason is not None:
+                    return sol
+                if not self.cutoff_reached:
+                    break
+                # out of nodes for this run, start pass again from its root
+                while state.depth > root_depth:
+                    state.undo()
+                self.num_restarts += 1
+                log.debug(f"restart {self.num_restarts} after {self.iters} iterations")
+                if self.stats is not None:
+                    self.stats.count('restart')
+        state.undo()
+        return None
+
+    def _node(self, state, culprits):
+        """
+        new search node for current state: [entry to branch on, node key, untried candidates, exclusion untried,
+        conflict set so far (see _search)]
+        """
+        entry = self._choose_entry(state)
+        untried = state.remaining_candidates.get(entry, 0) if entry is not None else 0
+        # candidates already removed from the domain of entry are never tried, so whatever removed them is part of
+        # the reason the node fails
+        return [entry, self._node_key(state), untried, entry is not None, culprits.get(entry, 1)]
+
+    def _node_key(self, state):
+        # key of current node in tables of refuted nodes and nogoods, failing inside a region is specific to it
+        return state.node_key if self.region_key is None else (state.node_key, self.region_key)
+
+    def _choose_entry(self, state):
+        """
+        most constrained entry, None if every entry is decided
+        when restarting, ties are broken by learned weights (if enabled) and then at random
+        """
+        if self.region is not None:
+            remaining = state.remaining_candidates
+            return min((entry for entry in self.region if entry in remaining),
+                       key=lambda entry: popcount(remaining[entry]), default=None)
+        if self.rng is None:
+            return state.entry_order.min_entry()
+        bucket = state.entry_order.min_bucket()
+        if bucket is None:
+            return None
+        if self.learn_weights:
+            weights = self.weights
+            max_weight = max(weights[entry] for entry in bucket)
+            return self.rng.choice([entry for entry in bucket if weights[entry] == max_weight])
+        return self.rng.choice(list(bucket))
+
+    def _choose_candidate(self, untried):
+        """
+        index of next candidate to try from bitmask of untried candidates: the best one (lowest index), except when
+        restarting, where with probability candidate_noise it is a random one
+        """
+        if self.rng is None or self.rng.random() >= self.candidate_noise:
+            return lowest_bit(untried)
+        return self.rng.choice(list(iter_bits(untried)))
+
+    def _search(self, state, k):
+        """
+        depth first search of subtree below current state, with at most k excluded entries
+        returns solution, or None if subtree has no solution (state is then back at the subtree root),
+        search budget ran out or node limit of restart was reached (cutoff_reached is then set, state is then left
+        where the search stopped)
+
+        conflict-directed backjumping: decision at level l is the l-th decision below the subtree root, level 0
+        stands for everything decided before the subtree root.  sets of levels are stored as bitmasks
+            - culprits[entry]: levels whose decisions (may have) changed the domain of entry, a change found by
+              propagation depends on the domains of the crossing entries and on the number of excluded entries,
+              so their culprits are added as well
+            - excluded[l]: levels responsible for the entries excluded after the decision at level l
+            - a failed branch is explained by the culprits of the entries it changed before failing (and of their
+              crossings), plus the levels responsible for the excluded entries
+            - a node fails with the union of these over its branches (its conflict set); instead of undoing only
+              the last decision, the search jumps back to the deepest level in the conflict set, since changing
+              any decision below it would lead to the same failure
+        the decisions at the levels of a conflict set are also stored as a nogood: later nodes of the same pass
+        making all of these decisions again (in any order) are skipped
+        """
+        stats = self.stats
+        backjump = self.backjump
+        root_key = self._node_key(state)
+        culprits = {}
+        culprit_trail = []
+        excluded = [1]
+        # current decisions, entry -> cand_idx (None if excluded), and their levels
+        assigned = {}
+        levels = {}
 
-        # backtracking solution
-        stack = [initial_grid_state]
+        stack = [self._node(state, culprits)]
+        # decisions (entry, cand_idx) leading from subtree root to each node on the stack, cand_idx None = excluded
+        path = []
 
-        iters = 0
         while stack:
-            grid = stack.pop()
-            found_next = False
-
-            if iters > MAX_ITERS:
-                return grid
-            if iters % PRINT_FREQ == 0:
-                grid.print()
-            iters += 1
-
-            while grid.candidates_to_try:
-                entry = grid.candidates_to_try.pop()
-                cand_idx_list = grid.remaining_candidates[entry]
-                crossings = grid.crossings[entry]
-
-                while cand_idx_list:
-                    cand_idx = cand_idx_list.pop()
-                    candidate_word = grid.all_candidates[entry][cand_idx]
-
-                    new_grid = grid.place(candidate_word, entry)
-                    if new_grid:
-                        if new_grid.is_filled:
-                            return new_grid
-                        # grid.entry_idx_to_try, grid.cand_idx_to_try = entry_idx, cand_idx + 1
-                        stack.append(grid)
-                        stack.append(new_grid)
-                        found_next = True
+            if self.budget.exhausted(self.iters, MAX_ITERS):
+                return None
+            if self.cutoff is not None and self.iters >= self.cutoff:
+                self.cutoff_reached = True
+                return None
+            if self.iters % PRINT_FREQ == 0:
+                state.print()
+            if stats is not None and self.iters % stats.trace_freq == 0:
+                stats.progress(self.iters, k=k, depth=state.depth, value=state.value())
+            self.iters += 1
+
+            node = stack[-1]
+            entry = node[ENTRY]
+            if entry is None:
+                # every entry has been placed or excluded
+                sol = state.to_grid_state()
+                self.budget.report(sol)
+                return sol
+
+            trail_start = len(state.domain_trail)
+            if node[UNTRIED]:
+                cand_idx = self._choose_candidate(node[UNTRIED])
+                node[UNTRIED] &= ~(1 << cand_idx)
+                found_next = state.place(state.all_candidates[entry][cand_idx], entry, k)
+                if stats is not None:
+                    stats.count('place')
+                    stats.count('place_rejected', not found_next)
+            elif node[EXCLUDE_PENDING]:
+                # out of candidates, last branch is to exclude entry
+                cand_idx = None
+                node[EXCLUDE_PENDING] = False
+                found_next = state.exclude(entry, k)
+                if stats is not None:
+                    stats.count('exclude')
+                    stats.count('exclude_rejected', not found_next)
+            else:
+                # all branches failed, record node as refuted and backtrack
+                if len(self.refuted) < MAX_REFUTED:
+                    self.refuted[node[KEY]] = max(self.refuted.get(node[KEY], -1), k - state.num_excluded)
+                stack.pop()
+                if not stack:
+                    return None
+
+                # level to go back to: last decision, or deepest level of conflict set when backjumping
+                level = len(path)
+                if backjump:
+                    level = node[CONFLICT].bit_length() - 1
+                    self._add_nogood(root_key, k, node[CONFLICT], path)
+                if level == 0:
+                    # failure does not depend on any decision below subtree root
+                    while path:
+                        self._undo_decision(state, path, assigned, levels, culprits, culprit_trail, excluded)
+                    return None
+                if stats is not None and level < len(path):
+                    stats.count('backjump')
+                    stats.count('backjump_levels', len(path) - level)
+                while len(path) >= level:
+                    self._undo_decision(state, path, assigned, levels, culprits, culprit_trail, excluded)
+                    if len(path) >= level:
+                        stack.pop()
+                stack[-1][CONFLICT] |= node[CONFLICT] & ~(1 << level)
+                continue
+
+            level = len(path) + 1
+            if not found_next:
+                if self.learn_weights:
+                    self.weights[entry] += 1
+                if backjump:
+                    node[CONFLICT] |= self._failure_conflict(state, culprits, excluded[-1], level)
+                continue
+
+            if self.refuted.get(self._node_key(state), -1) >= k - state.num_excluded:
+                state.undo()
+                node[CONFLICT] |= (1 << level) - 1
+                if stats is not None:
+                    stats.count('refuted_hit')
+                continue
+
+            if backjump:
+                nogood_conflict = self._check_nogoods(root_key, k, entry, cand_idx, assigned, levels)
+                if nogood_conflict is not None:
+                    state.undo()
+                    node[CONFLICT] |= nogood_conflict
+                    if stats is not None:
+                        stats.count('nogood_hit')
+                    continue
+                self._update_culprits(state, entry, cand_idx, level, trail_start, culprits, culprit_trail, excluded)
+
+            path.append((entry, cand_idx))
+            assigned[entry] = cand_idx
+            levels[entry] = level
+
+            regions = self._split(state, trail_start) if self.decompose else None
+            if regions is not None:
+                sol = self._solve_regions(state, k, regions)
+                if sol is not None or self.budget.reason is not None or self.cutoff_reached:
+                    return sol
+                # some region cannot be completed, so neither can this node
+                key = self._node_key(state)
+                if len(self.refuted) < MAX_REFUTED:
+                    self.refuted[key] = max(self.refuted.get(key, -1), k - state.num_excluded)
+                self._undo_decision(state, path, assigned, levels, culprits, culprit_trail, excluded)
+                node[CONFLICT] |= (1 << level) - 1
+                continue
+
+            stack.append(self._node(state, culprits))
+            if stats is not None:
+                stats.expand(len(path))
+            if self.budget.improves(state.value()):
+                self.budget.report(state.to_grid_state())
+
+        return None
+
+    def _split(self, state, trail_start):
+        """
+        returns regions (lists of entries) that the undecided entries of the current search fall apart into, now
+        that the entries decided since trail_start are gone from the crossing graph, or None if they do not
+        """
+        remaining, crossings = state.remaining_candidates, state.crossings
+        # a split separates the undecided crossings of newly decided entries
+        frontier = {}
+        for entry, old_mask in state.domain_trail[trail_start:]:
+            if old_mask is not None and entry not in remaining:
+                for cross_entry, _, _ in crossings[entry]:
+                    if cross_entry in remaining:
+                        frontier[cross_entry] = None
+        if len(frontier) < 2:
+            return None
+
+        frontier = list(frontier)
+        region = self._component(state, frontier[0], set(frontier[1:]))
+        if region is None:
+            return None
+        regions = [region]
+        seen = set(region)
+        for entry in frontier:
+            if entry not in seen:
+                regions.append(self._component(state, entry))
+                seen.update(regions[-1])
+        # undecided entries not reached from the frontier were never connected to it
+        rest = [entry for entry in (self.region if self.region is not None else remaining)
+                if entry in remaining and entry not in seen]
+        if rest:
+            regions.append(rest)
+        if self.stats is not None:
+            self.stats.count('split')
+        return regions
+
+    def _component(self, state, start, targets=None):
+        """
+        undecided entries connected to start in the crossing graph
+        if targets (a set of entries) is given, returns None as soon as all of them have been reached
+        """
+        remaining, crossings = state.remaining_candidates, state.crossings
+        component = [start]
+        seen = {start}
+        for entry in component:
+            for cross_entry, _, _ in crossings[entry]:
+                if cross_entry in remaining and cross_entry not in seen:
+                    seen.add(cross_entry)
+                    component.append(cross_entry)
+                    if targets is not None:
+                        targets.discard(cross_entry)
+                        if not targets:
+                            return None
+        return component
+
+    def _solve_regions(self, state, k, regions):
+        """
+        searches independent regions one after the other, each with as few excluded entries as possible (see above)
+        returns solution, with every region filled in (state is then left there), or None if some region cannot be
+        completed with at most k excluded entries in all (state is then back where it was) or the search stopped
+        """
+        depth = state.depth
+        outer_region, outer_region_key = self.region, self.region_key
+        try:
+            sol = None
+            for region in sorted(regions, key=len):
+                self.region, self.region_key = region, frozenset(region)
+                for max_excluded in range(state.num_excluded, k + 1):
+                    # tighter budget can prune more, keep these changes on their own level of the trail
+                    state.checkpoint()
+                    sol = self._search(state, max_excluded) if state.propagate(region, max_excluded) else None
+                    if sol is not None:
                         break
+                    if self.budget.reason is not None or self.cutoff_reached:
+                        return None
+                    state.undo()
+                else:
+                    while state.depth > depth:
+                        state.undo()
+                    return None
+            return sol
+        finally:
+            self.region, self.region_key = outer_region, outer_region_key
 
-                if found_next:
-                    break
+    def _undo_decision(self, state, path, assigned, levels, culprits, culprit_trail, excluded):
+        """
+        undoes last decision on path, together with the conflict bookkeeping of its level
+        """
+        state.undo()
+        entry, _ = path.pop()
+        del assigned[entry]
+        del levels[entry]
+        if len(culprit_trail) > len(path):
+            for _entry, old_culprit in reversed(culprit_trail.pop()):
+                if old_culprit is None:
+                    del culprits[_entry]
+                else:
+                    culprits[_entry] = old_culprit
+            excluded.pop()
+
+    def _update_culprits(self, state, entry, cand_idx, level, trail_start, culprits, culprit_trail, excluded):
+        """
+        records level as culprit of every domain changed by the decision just made (see _search)
+        """
+        bit = 1 << level
+        prev_excluded = excluded[-1]
+        new_excluded = prev_excluded | bit if cand_idx is None else prev_excluded
+        changes = []
+        for _entry, _ in state.domain_trail[trail_start:]:
+            if _entry == entry:
+                continue
+            culprit = culprits.get(_entry, 1) | bit | prev_excluded
+            for cross_entry, _, _ in state.crossings[_entry]:
+                culprit |= culprits.get(cross_entry, 1)
+            changes.append((_entry, culprits.get(_entry)))
+            culprits[_entry] = culprit
+            if _entry not in state.remaining_candidates:
+                new_excluded |= culprit
+        culprit_trail.append(changes)
+        excluded.append(new_excluded)
+
+    def _failure_conflict(self, state, culprits, prev_excluded, level):
+        """
+        levels explaining why the last place() or exclude() at given level failed (see _search)
+        """
+        if state.conflict_entries is None:
+            # word did not fit in grid, reason unknown
+            return (1 << level) - 1
+        conflict = prev_excluded
+        for entry in state.conflict_entries:
+            conflict |= culprits.get(entry, 1)
+            for cross_entry, _, _ in state.crossings[entry]:
+                conflict |= culprits.get(cross_entry, 1)
+        return conflict
+
+    def _add_nogood(self, root_key, k, conflict, path):
+        """
+        stores decisions at levels of conflict set as nogood, for pass k below subtree root with given key
+        """
+        if self.num_nogoods >= MAX_NOGOODS:
+            return
+        decisions = [path[level - 1] for level in range(1, len(path) + 1) if conflict >> level & 1]
+        if not decisions or len(decisions) > MAX_NOGOOD_SIZE:
+            return
+        # indexed by each of its decisions, holding the other decisions
+        for decision in decisions:
+            others = tuple(d for d in decisions if d != decision)
+            nogoods = self.nogoods.setdefault((root_key, k, decision), deque(maxlen=MAX_NOGOODS_PER_DECISION))
+            nogoods.appendleft(others)
+        self.num_nogoods += 1
+
+    def _check_nogoods(self, root_key, k, entry, cand_idx, assigned, levels):
+        """
+        returns conflict set of a nogood made up of decision (entry, cand_idx) and decisions in assigned,
+        None if there is none
+        """
+        for others in self.nogoods.get((root_key, k, (entry, cand_idx)), ()):
+            if all(assigned.get(_entry, _UNASSIGNED) == _cand_idx for _entry, _cand_idx in others):
+                conflict = 1
+                for _entry, _ in others:
+                    conflict |= 1 << levels[_entry]
+                return conflict
         return None
 
 
@@ -80,7 +527,7 @@ if __name__ == '__main__':
     MAX_ITERS = 500000
 
     p = puz.read(PUZ_DIR + EXAMPLE_PUZ + '.puz')
-    solver = BacktrackSolver(clue_model="web", puz_name=EXAMPLE_PUZ)
+    solver = BacktrackSolver(clue_model="web", puz_name=EXAMPLE_PUZ, max_excluded=MAX_EXCLUDED)
 
     sol, clue_model = solver.solve_puz(p)
     print("found solution!")
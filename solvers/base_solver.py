@@ -1,24 +1,111 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
+import queue
+import string
 import sys
+import threading
+from contextlib import nullcontext
 
 import logging
 log = logging.getLogger("crossword_logger")
 
-from clue_models import OracleSolver, WebSolver
-from solvers.grid_state import GridState
+from clue_models import OracleSolver, WebSolver, BERTSolver
+from solvers.grid_state import GridState, make_letter_masks, make_entry_slices, make_zobrist_table, encode, EMPTY, BLOCK
+from solvers.budget import SearchBudget
+
+# tables built once per puzzle from the candidates, kept for resolve()
+# cell_entries: entries through each cell (as a dict, cell index -> list of entries)
+PuzzleTables = namedtuple('PuzzleTables', ['width', 'height', 'all_candidates', 'crossings', 'letter_masks',
+                                           'entry_slices', 'zobrist_table', 'cell_entries'])
 
 
 class Solver:
-    def __init__(self, clue_model_type='oracle', load_candidates=True, save_candidates=False, puz_name=''):
+    def __init__(self, clue_model_type='oracle', load_candidates=True, puz_name='', max_excluded=None,
+                 clue_model_kwargs=None, stats=None):
+        """
+        max_excluded: maximum number of entries allowed to not come from the candidate lists
+                      (None = no limit, in which case candidates are not propagated through the crossing graph)
+        clue_model_kwargs: extra keyword arguments for the clue model, eg num_candidates_per_entry
+        stats: optional SearchStats, collects counters and timers of the solve (None = no instrumentation)
+        """
         self.clue_model_type = clue_model_type
         self.load_candidates = load_candidates
-        self.save_candidates = save_candidates
         self.puz_name = puz_name
+        self.max_excluded = max_excluded
+        self.clue_model_kwargs = {} if clue_model_kwargs is None else clue_model_kwargs
+        self.stats = stats
+        self.budget = SearchBudget()
+        self.clue_model = None
 
-    def solve_puz(self, p):
-        numbering = p.clue_numbering()
-        initial_grid = [[c for c in numbering.grid[i * p.width:(i + 1) * p.width]] for i in range(p.height)]
+        # puzzle of the last solve_puz call, with the grid it was last solved from and the candidates of each entry
+        # that fit the letters in that grid (see _seeded_state)
+        self.puzzle = None
+        self.cells = None
+        self.fit_masks = {}
+        # whether what a solver learned in its last search still holds for the next one (see resolve)
+        self.keep_learned = False
+
+    def solve_puz(self, p, budget=None):
+        """
+        returns (solution grid state, clue model)
+        letters already in the grid (p.fill) are kept, and only candidates fitting them are used
+        budget: optional SearchBudget limiting time, nodes and memory of the search, with cancellation and
+                a callback for every improved grid; if it runs out, the best grid found so far is returned
+        """
+        self._start(budget, width=p.width, height=p.height)
+        try:
+            sol = self._solve_puz(p)
+        finally:
+            # candidates are all generated by now, release the clue cache
+            if self.clue_model is not None:
+                self.clue_model.close()
+        self._end(sol)
+        return sol, self.clue_model
+
+    def resolve(self, fill, budget=None):
+        """
+        solves the puzzle of the last solve_puz call again, with the letters of fill fixed, eg after the user changed
+        some cells: fill is a string or list of rows, with '-' for empty cells and '.' for black squares
+        returns (solution grid state, clue model), like solve_puz
 
+        the candidates and the tables built from them are reused, and of the candidates fitting the grid only those
+        of entries through changed cells are recomputed, so setting up takes milliseconds; solvers also keep what
+        they learned about the puzzle between searches (eg refuted nodes of the backtracking solver)
+        propagation through the crossing graph is done again, since a changed letter can affect any entry
+        what was learned is only kept if letters were added to empty cells, removing or changing a letter can make
+        a refuted subtree solvable again
+        """
+        if self.puzzle is None:
+            raise ValueError("resolve needs an earlier call to solve_puz")
+        cells = bytearray(encode(''.join(''.join(row) for row in fill).lower()))
+        if len(cells) != len(self.cells) or any((c == BLOCK) != (old == BLOCK) for c, old in zip(cells, self.cells)):
+            raise ValueError("fill does not match the grid of the puzzle")
+        changed = {idx for idx, (c, old) in enumerate(zip(cells, self.cells)) if c != old}
+        self.keep_learned = all(self.cells[idx] == EMPTY for idx in changed)
+
+        self._start(budget, width=self.puzzle.width, height=self.puzzle.height, changed_cells=len(changed))
+        with self._timer('setup'):
+            initial_grid_state = self._seeded_state(cells, changed)
+        with self._timer('search'):
+            sol = self._solver(initial_grid_state)
+        self._end(sol)
+        return sol, self.clue_model
+
+    def _start(self, budget, **fields):
+        self.budget = SearchBudget() if budget is None else budget
+        self.budget.start()
+        if self.stats is not None:
+            self.stats.trace('start', solver=type(self).__name__, **fields)
+
+    def _end(self, sol):
+        if self.stats is not None:
+            self.stats.trace('end', value=None if sol is None else sol.value(), stop_reason=self.budget.reason,
+                             **self.stats.as_dict())
+
+    def _timer(self, name):
+        return self.stats.timer(name) if self.stats is not None else nullcontext()
+
+    def _solve_puz(self, p):
+        numbering = p.clue_numbering()
         entries = []
 
         for elem in numbering.across:
@@ -29,18 +116,43 @@ class Solver:
             cell, length, clue = elem['cell'], elem['len'], elem['clue'].lower()
             entries.append({'cell': cell, 'AD': 'D', 'length': length, 'clue': clue})
 
-        if self.clue_model_type == 'oracle':
-            self.clue_model = OracleSolver(p, entries, self.puz_name, load=self.load_candidates, save=self.save_candidates)
-        elif self.clue_model_type == 'web':
-            self.clue_model = WebSolver(entries, self.puz_name, load=self.load_candidates, save=self.save_candidates)
-        else:
-            raise NotImplementedError(f"Clue model {self.clue_model_type} not implemented")
+        with self._timer('clue_model'):
+            if self.clue_model_type == 'oracle':
+                self.clue_model = OracleSolver(p, entries, self.puz_name, load=self.load_candidates,
+                                               **self.clue_model_kwargs)
+            elif self.clue_model_type == 'web':
+                self.clue_model = WebSolver(entries, self.puz_name, load=self.load_candidates,
+                                            **self.clue_model_kwargs)
+            elif self.clue_model_type == 'bert':
+                self.clue_model = BERTSolver(entries, self.puz_name, load=self.load_candidates,
+                                             **self.clue_model_kwargs)
+            else:
+                raise NotImplementedError(f"Clue model {self.clue_model_type} not implemented")
+
+        with self._timer('setup'):
+            initial_board_state = self._initial_state(p, numbering, entries)
 
+        with self._timer('search'):
+            return self._solver(initial_board_state)
+
+    def _initial_state(self, p, numbering, entries):
+        """
+        builds initial GridState from puzzle and candidates of clue model, with the letters already in the grid
+        """
+        # candidates are lower case
+        initial_cells = bytearray(encode(''.join(numbering.grid).lower()))
         entry_cells = [(e['AD'], e['cell'] // p.width, e['cell'] % p.width) for e in entries]
-        all_candidates = {entry: cands for entry, cands in  zip(entry_cells, self.clue_model.candidates.values())}
+        # clue models differ in case
+        all_candidates = {entry: [word.lower() for word in cands]
+                          for entry, cands in zip(entry_cells, self.clue_model.candidates.values())}
 
-        initial_remaining_candidates = {entry: list(range(len(all_candidates[entry])))[::-1]
-                                        for entry in entry_cells}
+        lengths = {entry: e['length'] for entry, e in zip(entry_cells, entries)}
+        letter_masks = make_letter_masks(all_candidates, lengths)
+        entry_slices = make_entry_slices(p.width, lengths)
+        letters = {l for cands in all_candidates.values() for word in cands for l in word}
+        letters.update(string.ascii_lowercase)
+        letters.update(chr(c) for c in initial_cells if c != EMPTY and c != BLOCK)
+        zobrist_table = make_zobrist_table(p.width, p.height, letters, entry_cells)
 
         # make crossings
         cells = [[] for _ in range(p.width * p.height)]
@@ -57,9 +169,107 @@ class Solver:
             crossings[entry_cells[idx1]].append((entry_cells[idx2], i1, i2))
             crossings[entry_cells[idx2]].append((entry_cells[idx1], i2, i1))
 
-        initial_board_state = GridState(initial_grid, initial_remaining_candidates, all_candidates, crossings, num_excluded=0, num_empty=None)
+        cell_entries = defaultdict(list)
+        for entry, entry_slice in entry_slices.items():
+            for idx in range(entry_slice.start, entry_slice.stop, entry_slice.step):
+                cell_entries[idx].append(entry)
+
+        self.puzzle = PuzzleTables(p.width, p.height, all_candidates, crossings, letter_masks, entry_slices,
+                                   zobrist_table, cell_entries)
+        self.fit_masks = {}
+        self.keep_learned = False
+        return self._seeded_state(initial_cells)
+
+    def _seeded_state(self, cells, changed=None):
+        """
+        builds initial GridState for grid cells (bytearray) of the current puzzle, keeping the letters in it:
+            - candidates that do not fit the letters in their entry are removed, the resulting masks are kept in
+              fit_masks and only recomputed for entries through changed cells (set of cell indices, None = all)
+            - entries whose cells are all filled in are decided: their letters are taken as given, so they are
+              not counted as excluded even if they are not a candidate
+            - entries with no candidate that fits are excluded
+        and then propagates the remaining candidates through the crossing graph
+        """
+        tables = self.puzzle
+        if changed is None:
+            refit = tables.all_candidates
+        else:
+            refit = {entry for idx in changed for entry in tables.cell_entries.get(idx, ())}
+            # letters typed by the user may not have keys yet
+            for idx in changed:
+                if cells[idx] != EMPTY and (idx, chr(cells[idx])) not in tables.zobrist_table:
+                    tables.zobrist_table.update(make_zobrist_table(tables.width, tables.height, [chr(cells[idx])],
+                                                                   seed=cells[idx]))
+
+        for entry in refit:
+            mask = (1 << len(tables.all_candidates[entry])) - 1
+            for i, l in enumerate(cells[tables.entry_slices[entry]]):
+                if l != EMPTY:
+                    mask &= tables.letter_masks[entry][i].get(chr(l), 0)
+            self.fit_masks[entry] = mask
+
+        remaining_candidates, num_excluded = {}, 0
+        for entry, mask in self.fit_masks.items():
+            if EMPTY not in cells[tables.entry_slices[entry]]:
+                continue
+            if mask:
+                remaining_candidates[entry] = mask
+            else:
+                num_excluded += 1
+
+        self.cells = bytearray(cells)
+        initial_board_state = GridState(cells, tables.width, remaining_candidates, tables.all_candidates,
+                                        tables.crossings, tables.letter_masks, tables.entry_slices,
+                                        num_excluded=num_excluded, num_empty=None, zobrist_table=tables.zobrist_table,
+                                        stats=self.stats)
+        if not initial_board_state.propagate(list(remaining_candidates), self.max_excluded):
+            log.info(f"no solution with at most {self.max_excluded} excluded entries")
+        return initial_board_state
+
+    def iter_solve(self, p, budget=None):
+        """
+        runs solve_puz in a background thread, yielding each improved best-so-far grid state as the search runs
+        the last grid yielded is the final result; closing the generator early cancels the search
+        """
+        budget = SearchBudget() if budget is None else budget
+        improved = queue.Queue()
+        on_improved = budget.on_improved
+
+        def callback(grid_state):
+            if on_improved is not None:
+                on_improved(grid_state)
+            improved.put(grid_state)
+        budget.on_improved = callback
+
+        done = object()
+        result = []
+
+        def run():
+            try:
+                result.append(self.solve_puz(p, budget)[0])
+            except Exception as e:
+                result.append(e)
+            finally:
+                improved.put(done)
 
-        return self._solver(initial_board_state), self.clue_model
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        last = None
+        try:
+            while True:
+                grid_state = improved.get()
+                if grid_state is done:
+                    break
+                last = grid_state
+                yield grid_state
+            if isinstance(result[0], Exception):
+                raise result[0]
+            if result[0] is not None and result[0] is not last:
+                yield result[0]
+        finally:
+            budget.cancel_token.cancel()
+            thread.join()
+            budget.on_improved = on_improved
 
     def _solver(self):
         """
@@ -0,0 +1,133 @@
+"""
+per-call limits on a search, plus cancellation and reporting of the best grid found so far
+"""
+import os
+import threading
+import time
+
+try:
+    import psutil
+except ImportError:  # only needed where /proc is not available, memory limit is otherwise ignored
+    psutil = None
+
+import logging
+log = logging.getLogger("crossword_logger")
+
+
+def current_rss():
+    """
+    returns current resident memory of the process in bytes, None if it cannot be measured
+
+    unlike the peak reported by getrusage, this goes back down when memory is freed, so a limit on it only stops
+    the search that is actually using the memory, not every later search of the same process
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    return None
+
+
+class CancellationToken:
+    """
+    can be cancelled from another thread (eg, a request handler whose client went away) to stop a running search
+    """
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
+class SearchBudget:
+    """
+    limits for a single solve:
+
+    time_limit: wall clock seconds
+    max_nodes: number of search iterations (None = use MAX_ITERS of the solver's module)
+    max_memory: resident memory of the process, in bytes (see current_rss, ignored if it cannot be measured)
+    cancel_token: CancellationToken, search stops once it is cancelled
+    on_improved: callback, called with a GridState every time the best grid so far improves, and with the first
+                 complete grid found even if its value is worse (eg, more excluded entries than a partial grid)
+
+    when the budget runs out, solvers return the best grid found so far
+    """
+    # time, cancellation and memory are only checked every CHECK_FREQ nodes, to keep the check cheap
+    CHECK_FREQ = 256
+
+    def __init__(self, time_limit=None, max_nodes=None, max_memory=None, cancel_token=None, on_improved=None):
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.max_memory = max_memory
+        self.cancel_token = CancellationToken() if cancel_token is None else cancel_token
+        self.on_improved = on_improved
+        self.start()
+
+    def start(self):
+        self.start_time = time.time()
+        self.nodes = 0
+        self.best = None
+        self.best_value = None
+        self.first_complete = None
+        self.reason = None
+
+    @property
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def exhausted(self, nodes, default_max_nodes=None):
+        """
+        returns True if search should stop after given number of nodes, reason is then stored in self.reason
+        """
+        self.nodes = nodes
+        max_nodes = default_max_nodes if self.max_nodes is None else self.max_nodes
+        if max_nodes is not None and nodes > max_nodes:
+            self.reason = 'nodes'
+        elif nodes % self.CHECK_FREQ == 0:
+            self.check()
+        return self.reason is not None
+
+    def check(self):
+        """
+        checks limits that do not depend on node count, returns True if search should stop
+        """
+        if self.cancel_token.cancelled:
+            self.reason = 'cancelled'
+        elif self.time_limit is not None and self.elapsed > self.time_limit:
+            self.reason = 'time'
+        elif self.max_memory is not None and (current_rss() or 0) > self.max_memory:
+            self.reason = 'memory'
+        if self.reason is not None:
+            log.info(f"search budget exhausted: {self.reason}")
+        return self.reason is not None
+
+    @property
+    def remaining_time(self):
+        return None if self.time_limit is None else max(0., self.time_limit - self.elapsed)
+
+    def improves(self, value):
+        return self.best_value is None or value < self.best_value
+
+    def report(self, grid_state):
+        """
+        records grid_state as best so far if it has lower value than the current best, and as first complete grid
+        if it is the first complete one; passes it on to on_improved in either case
+        """
+        value = grid_state.value()
+        improves = self.improves(value)
+        first_complete = self.first_complete is None and grid_state.is_complete
+        if not improves and not first_complete:
+            return
+        if improves:
+            self.best, self.best_value = grid_state, value
+        if first_complete:
+            self.first_complete = grid_state
+        if self.on_improved is not None:
+            self.on_improved(grid_state)
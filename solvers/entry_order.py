@@ -0,0 +1,93 @@
+from itertools import islice
+import random
+
+
+class EntryOrder:
+    """
+    bucket queue of entries indexed by their number of remaining candidates
+    used to pick the most constrained entry without re-sorting all entries at every node
+
+    buckets[size] is a dict used as an insertion-ordered set, so ties are broken deterministically
+    """
+    def __init__(self, sizes=()):
+        self.buckets = []
+        self.sizes = {}
+        for entry, size in sizes:
+            self.add(entry, size)
+
+    def add(self, entry, size):
+        while len(self.buckets) <= size:
+            self.buckets.append({})
+        self.buckets[size][entry] = None
+        self.sizes[entry] = size
+
+    def remove(self, entry):
+        size = self.sizes.pop(entry)
+        del self.buckets[size][entry]
+
+    def update(self, entry, size):
+        """
+        moves entry to bucket for new size (adds it if not present)
+        """
+        old_size = self.sizes.get(entry)
+        if old_size == size:
+            return
+        if old_size is not None:
+            del self.buckets[old_size][entry]
+        self.add(entry, size)
+
+    def discard(self, entry):
+        if entry in self.sizes:
+            self.remove(entry)
+
+    def min_entry(self, min_size=0):
+        """
+        returns entry with fewest remaining candidates, ignoring entries with fewer than min_size
+        cost is bounded by the number of candidates per entry, not the number of entries
+        """
+        for bucket in islice(self.buckets, min_size, None):
+            if bucket:
+                return next(iter(bucket))
+        return None
+
+    def min_bucket(self, min_size=0):
+        """
+        returns all entries tied for fewest remaining candidates (ignoring entries with fewer than min_size),
+        as a dict whose keys are the entries, None if there are no entries
+        """
+        for bucket in islice(self.buckets, min_size, None):
+            if bucket:
+                return bucket
+        return None
+
+    def copy(self):
+        new = EntryOrder()
+        new.buckets = [dict(bucket) for bucket in self.buckets]
+        new.sizes = dict(self.sizes)
+        return new
+
+    def shuffled(self, seed):
+        """
+        returns copy in which ties between entries with the same number of candidates are broken in random order
+        """
+        rng = random.Random(seed)
+        new = EntryOrder()
+        for size, bucket in enumerate(self.buckets):
+            entries = list(bucket)
+            rng.shuffle(entries)
+            for entry in entries:
+                new.add(entry, size)
+        return new
+
+    def __iter__(self):
+        """
+        iterates over entries in order of increasing number of remaining candidates
+        """
+        for bucket in self.buckets:
+            yield from bucket
+
+    def __contains__(self, entry):
+        return entry in self.sizes
+
+    def __len__(self):
+        return len(self.sizes)
@@ -1,89 +1,294 @@
+import random
+import numpy as np
 import logging
 log = logging.getLogger("crossword_logger")
 
+from solvers.entry_order import EntryOrder
+from solvers.propagation import propagate
+
+
+# weight of an excluded entry relative to an empty cell, when comparing partial grids
+EXCLUDED_WEIGHT = 2
+
+"""
+candidate domains are stored as integer bitsets: bit i of remaining_candidates[entry] is set
+iff all_candidates[entry][i] is still consistent with the grid
+"""
+if hasattr(int, 'bit_count'):
+    popcount = int.bit_count
+else:  # int.bit_count is new in python 3.10
+    def popcount(mask):
+        return bin(mask).count('1')
+
+
+def lowest_bit(mask):
+    """
+    index of lowest set bit of (nonzero) mask
+    """
+    return (mask & -mask).bit_length() - 1
+
+
+def iter_bits(mask):
+    """
+    iterates over indices of set bits in mask, lowest first
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def make_letter_masks(all_candidates, lengths):
+    """
+    builds table letter_masks[entry][i][letter] -> bitmask of candidates of entry with given letter at position i
+    computed once per puzzle, used by place() to filter crossing domains with a single AND
+    """
+    letter_masks = {}
+    for entry, cands in all_candidates.items():
+        masks = [{} for _ in range(lengths[entry])]
+        for cand_idx, word in enumerate(cands):
+            bit = 1 << cand_idx
+            for i, l in enumerate(word):
+                masks[i][l] = masks[i].get(l, 0) | bit
+        letter_masks[entry] = masks
+    return letter_masks
+
+
+def make_letter_matrices(all_candidates, lengths):
+    """
+    builds table letter_matrices[entry] -> uint8 array (number of candidates x length) holding the letters of each
+    candidate of entry (encoded as in the grid, see below), used to score all candidates of an entry at once
+    """
+    return {entry: np.frombuffer(b''.join(encode(word) for word in cands), dtype=np.uint8).reshape(len(cands), lengths[entry])
+            for entry, cands in all_candidates.items()}
+
+
+def mask_to_array(mask, n):
+    """
+    boolean array of length n, True at indices of set bits of mask
+    """
+    return np.unpackbits(np.frombuffer(mask.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8), count=n,
+                         bitorder='little').view(bool)
+
+
+def make_entry_slices(width, lengths):
+    """
+    slice of the flat grid holding each entry (AD, row, col), given dictionary of entry lengths
+    across entries are contiguous, down entries have a step of one row, so reading an entry is a single slice
+    """
+    slices = {}
+    for (AD, r, c), length in lengths.items():
+        step = 1 if AD == 'A' else width
+        start = r * width + c
+        slices[(AD, r, c)] = slice(start, start + length * step, step)
+    return slices
+
+
+def make_zobrist_table(width, height, letters, entries=(), seed=0):
+    """
+    random 64 bit key for each (cell index, letter), the hash of a grid is the xor of the keys of its filled cells
+    lets GridState update its hash in O(1) per letter placed
+
+    also holds a key for each entry (AD, row, col), used by SearchState to hash which entries have been decided
+    """
+    rng = random.Random(seed)
+    table = {(idx, l): rng.getrandbits(64) for idx in range(width * height) for l in sorted(letters)}
+    table.update({entry: rng.getrandbits(64) for entry in entries})
+    return table
+
+
+"""
+the grid is stored as a flat bytearray, row by row, with one ascii character per cell:
+EMPTY for a cell still to fill, BLOCK for a black square, otherwise the letter in the cell
+"""
+EMPTY = ord('-')
+BLOCK = ord('.')
+
+
+def encode(word):
+    return word.encode('ascii', 'replace')
+
+
+def fits(word_bytes, cur):
+    """
+    whether word (bytes) can be placed over the current contents cur (bytes) of an entry
+    """
+    if len(word_bytes) != len(cur):
+        return False
+    if EMPTY not in cur:
+        return word_bytes == cur
+    return all(c == EMPTY or c == w for w, c in zip(word_bytes, cur))
+
+
 class GridState:
-    def __init__(self, grid, remaining_candidates, all_candidates, crossings, num_excluded=0, num_empty=None):
+    def __init__(self, cells, width, remaining_candidates, all_candidates, crossings, letter_masks, entry_slices,
+                 num_excluded=0, num_empty=None, entry_order=None, zobrist_table=None, zobrist_hash=None, stats=None):
+        """
+        cells: flat bytearray of grid (see above), owned by the new state (not copied)
+        entry_slices: slice of cells holding each entry, see make_entry_slices
+        """
 
         # grid state data
-        self.grid = [[c for c in row] for row in grid] # make copy of grid
+        self.cells = cells
 
-        self.remaining_candidates = {entry: [cand_idx for cand_idx in remaining_candidates[entry]]
-                                     for entry in remaining_candidates} # make copy of remaining candidates
+        self.remaining_candidates = dict(remaining_candidates) # make copy of remaining candidates (bitsets are immutable)
         self.num_excluded = num_excluded
         if num_empty is None:
-            num_empty = sum([len([c for c in row if c == '-']) for row in grid])
+            num_empty = cells.count(EMPTY)
         self.num_empty = num_empty
 
         # global grid information
         self.all_candidates = all_candidates
         self.crossings = crossings
+        self.letter_masks = letter_masks
+        self.entry_slices = entry_slices
+        self.zobrist_table = zobrist_table
+        self.stats = stats # SearchStats, or None if not instrumented
+
+        # remaining entries bucketed by number of remaining candidates (most constrained first)
+        if entry_order is None:
+            entry_order = EntryOrder((entry, popcount(mask)) for entry, mask in self.remaining_candidates.items())
+        self.entry_order = entry_order
 
-        # determine optimal candidate order (for backtracking)
-        self.candidates_to_try = [entry for _, entry in sorted(
-            [(len(self.remaining_candidates[entry]), entry) for entry in self.remaining_candidates],
-            reverse=True)]
+        self.width, self.height = width, len(cells) // width
 
-        self.width, self.height = len(grid[0]), len(grid)
+        if zobrist_hash is None and zobrist_table is not None:
+            zobrist_hash = 0
+            for idx, l in enumerate(cells):
+                if l != EMPTY and l != BLOCK:
+                    zobrist_hash ^= zobrist_table[(idx, chr(l))]
+        self.zobrist_hash = zobrist_hash
+
+    @property
+    def grid(self):
+        """
+        grid as list of rows, each a list of one character strings
+        """
+        return [list(self.cells[r * self.width:(r + 1) * self.width].decode('ascii')) for r in range(self.height)]
 
     def get_entry(self, entry):
-        AD, r, c = entry
-        out = []
-        if AD == 'A':
-            while c < self.width and self.grid[r][c] != '.':
-                out.append(self.grid[r][c])
-                c += 1
-        elif AD == 'D':
-            while r < self.height and self.grid[r][c] != '.':
-                out.append(self.grid[r][c])
-                r += 1
-
-        return ''.join(out)
-
-    def place(self, word, entry):
-        (AD, r, c) = entry
-        #log.debug(f"trying to fit {word} in cell {(r,c)}")
-
-        cur_word = self.get_entry(entry)
-        if not(len(word) == len(cur_word) and all([c1 == c2 or c2 == '-' for c1, c2 in zip(word, cur_word)])):
+        return self.cells[self.entry_slices[entry]].decode('ascii')
+
+    def set_candidates(self, entry, mask):
+        """
+        sets domain of entry (None removes entry), only used on states that are still being built
+        """
+        if mask is None:
+            del self.remaining_candidates[entry]
+            self.entry_order.discard(entry)
+        else:
+            self.remaining_candidates[entry] = mask
+            self.entry_order.update(entry, popcount(mask))
+
+    def propagate(self, entries, max_excluded=None):
+        """
+        prunes candidates not supported by crossing entries (see propagation.py), starting from given entries
+        modifies state in place, returns False if more than max_excluded entries end up excluded
+        """
+        return propagate(self, entries, max_excluded)
+
+    def score_move(self, word, entry, max_excluded=None):
+        """
+        returns (num_empty, num_excluded) of the state place(word, entry) would produce, or None if word does not fit
+        only counts are computed, no new state is built (so the effect of propagation is not included)
+        """
+        cur = self.cells[self.entry_slices[entry]]
+        if not fits(encode(word), cur):
+            return None
+
+        new_num_excluded = self.num_excluded
+        for _entry, i1, i2 in self.crossings[entry]:
+            if _entry in self.remaining_candidates and \
+                    not self.remaining_candidates[_entry] & self.letter_masks[_entry][i2].get(word[i1], 0):
+                new_num_excluded += 1
+        if max_excluded is not None and new_num_excluded > max_excluded:
+            return None
+
+        return self.num_empty - cur.count(EMPTY), new_num_excluded
+
+    def place(self, word, entry, max_excluded=None):
+        """
+        returns new GridState with word placed in entry, or None if word does not fit
+        if max_excluded is given, also returns None if the new state has more than max_excluded excluded entries,
+        and propagates the resulting domain changes through the crossing graph
+        """
+        entry_slice = self.entry_slices[entry]
+        word_bytes = encode(word)
+        cur = self.cells[entry_slice]
+        if not fits(word_bytes, cur):
             return None
 
         # make copies of parameters to create new Grid object
-        new_remaining_candidates = {_entry: [cand_idx for cand_idx in self.remaining_candidates[_entry]]
-                                    for _entry in self.remaining_candidates}
-        del new_remaining_candidates[entry]
+        new_remaining_candidates = dict(self.remaining_candidates)
+        new_remaining_candidates.pop(entry, None)
+        new_entry_order = self.entry_order.copy()
+        new_entry_order.discard(entry)
         new_num_excluded = self.num_excluded
         new_num_empty = self.num_empty
+        new_zobrist_hash = self.zobrist_hash
+        changed = []
 
         # check crossings to see what candidates are eliminated
+        if self.stats is not None:
+            self.stats.count('crossing_checks', len(self.crossings[entry]))
         for _entry, i1, i2 in self.crossings[entry]:
-            l = word[i1]
-            new_entry_candidates = []
-            for cand_idx in new_remaining_candidates.get(_entry, []):
-                if self.all_candidates[_entry][cand_idx][i2] == l:
-                    new_entry_candidates.append(cand_idx)
-            if len(new_entry_candidates) > 0:
+            if _entry not in new_remaining_candidates:
+                continue
+            new_entry_candidates = new_remaining_candidates[_entry] & self.letter_masks[_entry][i2].get(word[i1], 0)
+            if new_entry_candidates and new_entry_candidates == new_remaining_candidates[_entry]:
+                continue
+            changed.append(_entry)
+            if new_entry_candidates:
                 new_remaining_candidates[_entry] = new_entry_candidates
-            elif _entry in new_remaining_candidates:
+                new_entry_order.update(_entry, popcount(new_entry_candidates))
+            else:
                 del new_remaining_candidates[_entry]
+                new_entry_order.remove(_entry)
                 new_num_excluded += 1
+        if max_excluded is not None and new_num_excluded > max_excluded:
+            return None
 
         # valid entry, create new Grid object
-        new_grid = [[c for c in row] for row in self.grid]
-        for i in range(len(word)):
-            if new_grid[r][c] == '-':
-                new_num_empty -= 1
-            new_grid[r][c] = word[i]
-            if AD == 'A':
-                c += 1
-            else:
-                r += 1
+        new_cells = bytearray(self.cells)
+        new_cells[entry_slice] = word_bytes
+        if EMPTY in cur:
+            new_num_empty -= cur.count(EMPTY)
+            if self.zobrist_table is not None:
+                for i, idx in enumerate(range(entry_slice.start, entry_slice.stop, entry_slice.step)):
+                    if cur[i] == EMPTY:
+                        new_zobrist_hash ^= self.zobrist_table[(idx, word[i])]
+
+        new_state = GridState(new_cells, self.width, new_remaining_candidates, self.all_candidates, self.crossings,
+                              self.letter_masks, self.entry_slices, num_excluded=new_num_excluded, num_empty=new_num_empty,
+                              entry_order=new_entry_order, zobrist_table=self.zobrist_table, zobrist_hash=new_zobrist_hash,
+                              stats=self.stats)
+        if not new_state.propagate(changed, max_excluded):
+            return None
+        return new_state
 
-        return GridState(new_grid, new_remaining_candidates, self.all_candidates, self.crossings, num_excluded=new_num_excluded, num_empty=new_num_empty)
+    def same_grid(self, other):
+        """
+        cheap equality check on grid contents: compares hashes first, only compares cells on a hash match
+        """
+        if self.zobrist_hash is not None and other.zobrist_hash is not None and self.zobrist_hash != other.zobrist_hash:
+            return False
+        return self.cells == other.cells
+
+    def value(self, excluded_weight=EXCLUDED_WEIGHT):
+        """
+        lower is better: number of empty cells plus weighted number of excluded entries
+        """
+        return self.num_empty + excluded_weight * self.num_excluded
 
     @property
     def is_filled(self):
         return self.num_empty == 0
 
+    @property
+    def is_complete(self):
+        # every cell filled, or every entry placed or excluded (A_k solution)
+        return self.is_filled or not self.remaining_candidates
+
     def print(self):
         print("\ngrid:")
         print('_'*(2*self.width+1))
@@ -0,0 +1,252 @@
+"""
+LOCAL SEARCH:
+
+backtracking and priority search build up the grid one entry at a time, and stall on large grids where many
+entries have no correct candidate.  local search instead works on a full assignment, in which every entry either
+holds one of its candidates or is excluded, and repeatedly reassigns a single entry:
+
+    - start by placing the best candidate of each entry (most constrained first) unless it conflicts with a crossing
+      word already placed, in which case the entry is excluded
+    - the cost of an assignment is excluded_weight for every excluded entry plus one for every empty cell, so it is
+      the value of the grid it gives (see GridState.value)
+    - at each step, pick an excluded entry at random and place the candidate with the fewest (weighted) conflicts
+      (min-conflicts): the crossing words it conflicts with are excluded, so the assignment never has conflicts
+    - a move that increases the cost is only made with probability exp(-increase / temperature) (simulated
+      annealing), the temperature drops every step and is raised again after STALL_STEPS steps without a new best
+    - a candidate that is removed from an entry is tabu for tabu_tenure steps, unless placing it gives a new best
+
+the cost of a step depends on the number of candidates and crossings of a single entry, not on the size of the grid
+or on any search depth.  the best assignment so far is reported to the search budget every REPORT_FREQ steps, so
+the search can be stopped at any time
+
+max_excluded is not enforced, the best grid found is returned whatever its number of excluded entries
+"""
+import math
+import random
+import logging
+log = logging.getLogger("crossword_logger")
+
+from solvers.base_solver import Solver
+from solvers.grid_state import iter_bits, encode, fits, EMPTY, EXCLUDED_WEIGHT
+from solvers.search_state import SearchState
+
+MAX_STEPS = 200000
+PRINT_FREQ = 10000
+REPORT_FREQ = 1000
+TABU_TENURE = 10
+START_TEMPERATURE = 5.
+COOLING = 0.9999
+MIN_TEMPERATURE = 0.05
+STALL_STEPS = 5000
+
+# value of an excluded entry in an assignment
+EXCLUDED = -1
+
+
+class _IndexedSet:
+    """
+    set with add, discard and uniform random choice in constant time
+    """
+    def __init__(self):
+        self.items = []
+        self.index = {}
+
+    def add(self, item):
+        if item not in self.index:
+            self.index[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        idx = self.index.pop(item, None)
+        if idx is None:
+            return
+        last = self.items.pop()
+        if idx < len(self.items):
+            self.items[idx] = last
+            self.index[last] = idx
+
+    def choice(self, rng):
+        return self.items[int(rng.random() * len(self.items))]
+
+    def __len__(self):
+        return len(self.items)
+
+
+class LocalSearchSolver(Solver):
+    def __init__(self, seed=0, excluded_weight=EXCLUDED_WEIGHT, tabu_tenure=TABU_TENURE,
+                 start_temperature=START_TEMPERATURE, cooling=COOLING, **kwargs):
+        """
+        seed: seed of random choices, the search is reproducible given the seed (and a budget without time limit)
+        excluded_weight: cost of an excluded entry, relative to an empty cell
+        tabu_tenure: number of steps a candidate removed from an entry cannot be placed there again
+        start_temperature, cooling: initial temperature of annealing, and factor it is multiplied by every step
+        """
+        super().__init__(**kwargs)
+        self.seed = seed
+        self.excluded_weight = excluded_weight
+        self.tabu_tenure = tabu_tenure
+        self.start_temperature = start_temperature
+        self.cooling = cooling
+
+    def _solver(self, initial_grid_state):
+        self._setup(initial_grid_state)
+        rng = random.Random(self.seed)
+        stats = self.stats
+        values, excluded = self.values, self.excluded
+        tabu = {}
+
+        best_cost, best_values, best_step = self.cost, list(values), 0
+        reported_step = 0
+        temperature = self.start_temperature
+        last_reheat = 0
+        step = 0
+
+        while not self.budget.exhausted(step, MAX_STEPS):
+            if step % PRINT_FREQ == 0:
+                log.debug(f"local search step {step}: cost {self.cost}, best {best_cost}, temperature {temperature:.3f}")
+            if stats is not None and step % stats.trace_freq == 0:
+                stats.progress(step, value=best_cost, cost=self.cost, excluded=len(excluded))
+            if step % REPORT_FREQ == 0 and best_step >= reported_step:
+                self.budget.report(self._grid_state(initial_grid_state, best_values))
+                reported_step = step + 1
+            step += 1
+
+            if not excluded:
+                # every entry with candidates is placed, cannot do better
+                break
+            e = excluded.choice(rng)
+
+            # candidate of e with the lowest cost that is not tabu (or gives a new best), ties broken at random
+            best_moves, best_delta = [], None
+            for v in range(len(self.words[e])):
+                conflicts = self._conflicts(e, v)
+                delta = self._delta(e, conflicts)
+                if tabu.get((e, v), 0) > step and self.cost + delta >= best_cost:
+                    continue
+                if best_delta is None or delta < best_delta:
+                    best_moves, best_delta = [(v, conflicts)], delta
+                elif delta == best_delta:
+                    best_moves.append((v, conflicts))
+            if not best_moves:
+                continue
+
+            if best_delta > 0 and rng.random() >= math.exp(-best_delta / temperature):
+                if stats is not None:
+                    stats.count('move_rejected')
+                continue
+
+            v, conflicts = best_moves[int(rng.random() * len(best_moves))]
+            for f in conflicts:
+                tabu[(f, values[f])] = step + self.tabu_tenure
+                values[f] = EXCLUDED
+                excluded.add(f)
+            values[e] = v
+            excluded.discard(e)
+            self.cost += best_delta
+            if stats is not None:
+                stats.count('move')
+
+            if self.cost < best_cost:
+                best_cost, best_values, best_step = self.cost, list(values), step
+            temperature = max(temperature * self.cooling, MIN_TEMPERATURE)
+            if step - max(best_step, last_reheat) > STALL_STEPS:
+                temperature, last_reheat = self.start_temperature, step
+
+        sol = self._grid_state(initial_grid_state, best_values)
+        self.budget.report(sol)
+        return sol
+
+    def _setup(self, initial_grid_state):
+        """
+        builds initial assignment (see above) and its cost
+        entries that are already decided in the initial grid keep their letters and are left out of the assignment
+        """
+        self.entries = list(initial_grid_state.entry_order)
+        index = {entry: e for e, entry in enumerate(self.entries)}
+        cells = initial_grid_state.cells
+
+        # candidates (as bytes, with their index in all_candidates) that fit the letters already in the grid
+        self.words, self.cand_idx = [], []
+        for entry in self.entries:
+            cur = cells[initial_grid_state.entry_slices[entry]]
+            cands = [(cand_idx, encode(initial_grid_state.all_candidates[entry][cand_idx]))
+                     for cand_idx in iter_bits(initial_grid_state.remaining_candidates[entry])]
+            cands = [(cand_idx, word) for cand_idx, word in cands if fits(word, cur)]
+            self.cand_idx.append([cand_idx for cand_idx, _ in cands])
+            self.words.append([word for _, word in cands])
+
+        # crossings between entries of the assignment: (other entry, position in entry, position in other entry,
+        # whether shared cell is empty in the initial grid), and number of empty cells an entry shares with decided
+        # entries (which stay empty if the entry is excluded)
+        self.crossings, self.open_cells = [], []
+        for entry in self.entries:
+            entry_slice = initial_grid_state.entry_slices[entry]
+            crossings, open_cells = [], 0
+            for _entry, i1, i2 in initial_grid_state.crossings[entry]:
+                empty = cells[entry_slice.start + i1 * entry_slice.step] == EMPTY
+                if _entry in index:
+                    crossings.append((index[_entry], i1, i2, empty))
+                else:
+                    open_cells += empty
+            self.crossings.append(crossings)
+            self.open_cells.append(open_cells)
+
+        n = len(self.entries)
+        self.values = [EXCLUDED] * n
+        for e in range(n):
+            if self.words[e] and not self._conflicts(e, 0):
+                self.values[e] = 0
+
+        # entries with no candidates are always excluded, and never picked
+        self.excluded = _IndexedSet()
+        self.cost = 0
+        for e in range(n):
+            if self.values[e] != EXCLUDED:
+                continue
+            if self.words[e]:
+                self.excluded.add(e)
+            self.cost += self.excluded_weight + self.open_cells[e]
+            # cells shared by two excluded entries, counted from the entry with the lower index
+            self.cost += sum(empty and f < e and self.values[f] == EXCLUDED for f, _, _, empty in self.crossings[e])
+
+    def _conflicts(self, e, v):
+        """
+        placed crossing entries that disagree with candidate v of entry e
+        """
+        values, words = self.values, self.words
+        word = words[e][v]
+        return [f for f, i1, i2, _ in self.crossings[e] if values[f] != EXCLUDED and words[f][values[f]][i2] != word[i1]]
+
+    def _delta(self, e, conflicts):
+        """
+        change in cost from placing a candidate of excluded entry e, which excludes the given conflicting entries
+        """
+        values = self.values
+        # e is no longer excluded, and fills the cells it shares with excluded entries
+        delta = -self.excluded_weight - self.open_cells[e]
+        for f, _, _, empty in self.crossings[e]:
+            if empty and values[f] == EXCLUDED:
+                delta -= 1
+        # each conflicting entry is excluded, emptying the cells it shares with excluded entries other than e
+        # (a cell shared by two conflicting entries is counted once)
+        for f in conflicts:
+            delta += self.excluded_weight + self.open_cells[f]
+            for g, _, _, empty in self.crossings[f]:
+                if empty and g != e and (values[g] == EXCLUDED or (g < f and g in conflicts)):
+                    delta += 1
+        return delta
+
+    def _grid_state(self, initial_grid_state, values):
+        """
+        returns GridState of given assignment
+        """
+        state = SearchState(initial_grid_state)
+        # exclude first, so that placing the other words cannot empty the domain of an excluded entry
+        for e, v in enumerate(values):
+            if v == EXCLUDED:
+                state.exclude(self.entries[e])
+        for e, v in enumerate(values):
+            if v != EXCLUDED:
+                entry = self.entries[e]
+                state.place(state.all_candidates[entry][self.cand_idx[e][v]], entry)
+        return state.to_grid_state()
@@ -0,0 +1,166 @@
+"""
+PORTFOLIO SOLVER:
+
+it is hard to know in advance which solver (and which settings) will be fastest on a given grid,
+so run several configurations at once in a pool of processes:
+    - each worker gets a copy of the initial grid state and runs one configuration
+    - the first worker to return a complete grid wins, the other workers are terminated
+    - workers stream every improved grid back as they search, so if no worker finds a complete grid before the
+      time limit, the best partial grid found by any worker is returned (at worst the initial grid)
+    - grids are sent back as snapshots (cells, domains, number of excluded entries), not as pickled GridStates,
+      which would carry the tables shared by all states of the puzzle with every report (~280KB on a 21x21 grid);
+      the master rebuilds them on top of its own initial grid state
+
+a configuration is a tuple (solver class, keyword arguments for solver, seed)
+if seed is not None, ties in the entry order are broken randomly using this seed
+"""
+import multiprocessing as mp
+import os
+import pickle
+import queue
+import time
+
+import logging
+log = logging.getLogger("crossword_logger")
+
+from solvers.base_solver import Solver
+from solvers.budget import SearchBudget
+from solvers.grid_state import GridState
+from solvers.backtrack_solver import BacktrackSolver
+from solvers.priority_solver import PrioritySolver
+
+DEFAULT_CONFIGS = [
+    (BacktrackSolver, {}, None),
+    (PrioritySolver, {'excluded_weight': 2}, None),
+    (PrioritySolver, {'excluded_weight': 1}, None),
+    (PrioritySolver, {'excluded_weight': 4}, None),
+    (BacktrackSolver, {}, 1),
+    (PrioritySolver, {'excluded_weight': 2}, 1),
+    (BacktrackSolver, {}, 2),
+    (PrioritySolver, {'excluded_weight': 2}, 2),
+]
+
+
+# pickled initial grid state, sent once to each worker process when the pool starts
+# (sending it with every task can fill the pipe to the workers, and then terminating the pool hangs)
+_initial_grid_state = None
+
+
+def _init_worker(initial_grid_state):
+    global _initial_grid_state
+    _initial_grid_state = initial_grid_state
+
+
+def _snapshot(grid_state):
+    """
+    the part of grid_state that differs between states of a search, see _restore
+    """
+    if grid_state is None:
+        return None
+    return bytes(grid_state.cells), grid_state.remaining_candidates, grid_state.num_excluded
+
+
+def _restore(snapshot, initial_grid_state):
+    """
+    rebuilds GridState from snapshot, sharing the puzzle tables of initial_grid_state
+    """
+    if snapshot is None:
+        return None
+    cells, remaining_candidates, num_excluded = snapshot
+    return GridState(bytearray(cells), initial_grid_state.width, remaining_candidates, initial_grid_state.all_candidates,
+                     initial_grid_state.crossings, initial_grid_state.letter_masks, initial_grid_state.entry_slices,
+                     num_excluded=num_excluded, zobrist_table=initial_grid_state.zobrist_table,
+                     stats=initial_grid_state.stats)
+
+
+def _run_config(solver_class, solver_kwargs, seed, worker_budget, improved):
+    """
+    runs in worker process, on a fresh copy of the initial grid state
+    worker_budget: (max_nodes, max_memory, deadline), deadline is a time.time() value or None
+    improved: queue that snapshots of improved grids are sent back on
+    returns snapshot of the grid found
+    """
+    initial_grid_state = pickle.loads(_initial_grid_state)
+    if seed is not None:
+        initial_grid_state.entry_order = initial_grid_state.entry_order.shuffled(seed)
+    solver = solver_class(**solver_kwargs)
+    max_nodes, max_memory, deadline = worker_budget
+    # the worker may only start once another configuration is done, so the time left is measured here
+    time_limit = None if deadline is None else max(0., deadline - time.time())
+    solver.budget = SearchBudget(time_limit=time_limit, max_nodes=max_nodes, max_memory=max_memory,
+                                 on_improved=lambda grid_state: improved.put(_snapshot(grid_state)))
+    return _snapshot(solver._solver(initial_grid_state))
+
+
+class PortfolioSolver(Solver):
+    def __init__(self, configs=None, num_workers=None, time_limit=None, **kwargs):
+        """
+        configs: list of (solver class, solver kwargs, seed), see above
+        num_workers: number of processes (default: one per configuration, up to number of cpus)
+        time_limit: seconds to wait for a complete grid (None = wait for all workers, besides the search budget)
+
+        max_nodes and max_memory of the search budget apply to each worker separately
+        """
+        super().__init__(**kwargs)
+        self.configs = DEFAULT_CONFIGS if configs is None else configs
+        self.num_workers = min(len(self.configs), os.cpu_count() or 1) if num_workers is None else num_workers
+        self.time_limit = time_limit
+
+    def _solver(self, initial_grid_state):
+        results = queue.Queue()
+        time_limits = [t for t in (self.time_limit, self.budget.remaining_time) if t is not None]
+        deadline = time.time() + min(time_limits) if time_limits else None
+        sol, sol_config = None, None
+        worker_budget = (self.budget.max_nodes, self.budget.max_memory, deadline)
+        self.budget.report(initial_grid_state)
+
+        # leaving the with blocks terminates the pool, which kills any workers still running
+        with mp.Manager() as manager, \
+                mp.Pool(self.num_workers, initializer=_init_worker, initargs=(pickle.dumps(initial_grid_state),)) as pool:
+            improved = manager.Queue()
+            for idx, (solver_class, solver_kwargs, seed) in enumerate(self.configs):
+                solver_kwargs = {'max_excluded': self.max_excluded, **solver_kwargs}
+                pool.apply_async(_run_config, (solver_class, solver_kwargs, seed, worker_budget, improved),
+                                 callback=lambda res, idx=idx: results.put((idx, res)),
+                                 error_callback=lambda err, idx=idx: results.put((idx, err)))
+
+            num_results = 0
+            while num_results < len(self.configs):
+                self._report_improved(improved, initial_grid_state)
+                try:
+                    idx, res = results.get(timeout=0.05)
+                    num_results += 1
+                except queue.Empty:
+                    if self.budget.check() or (deadline is not None and time.time() > deadline):
+                        log.info("portfolio solver out of time")
+                        break
+                    continue
+
+                if isinstance(res, Exception):
+                    log.info(f"configuration {self.configs[idx]} failed: {res!r}")
+                    continue
+                if res is None:
+                    continue
+                res = _restore(res, initial_grid_state)
+                self.budget.report(res)
+                if res.is_complete:
+                    sol, sol_config = res, self.configs[idx]
+                    break
+            self._report_improved(improved, initial_grid_state)
+
+        if sol is None:
+            # best grid any worker reported, the initial grid if none did
+            sol = self.budget.best
+        log.info(f"portfolio solver: returning grid from configuration {sol_config}")
+        return sol
+
+    def _report_improved(self, improved, initial_grid_state):
+        """
+        passes grids streamed back by the workers on to the search budget
+        """
+        while True:
+            try:
+                snapshot = improved.get_nowait()
+            except queue.Empty:
+                return
+            self.budget.report(_restore(snapshot, initial_grid_state))
@@ -1,9 +1,14 @@
-from heapq import heappush, heappop
+from collections import deque
+from heapq import heappush, heappop, heapify, nsmallest
+from operator import itemgetter
+import weakref
 import logging
 log = logging.getLogger("crossword_logger")
 
 PRINT_FREQ = 1000
 MAX_ITERS = 5000
+# with a bounded frontier, the worst states are pruned once the frontier is this fraction over its maximum size
+PRUNE_SLACK = 0.1
 
 """
 base class for state used in priority search
@@ -21,6 +26,25 @@ class QueueState:
         """
         pass
 
+    @property
+    def scored_moves(self):
+        return self._scored_moves()
+
+    def _scored_moves(self):
+        """
+        optional: returns iterator over pairs (heuristic of next state, move), where apply(move) gives the next state
+        default builds every next state, child classes can override to score moves without building them
+        """
+        for state in self.moves:
+            yield state.heuristic, state
+
+    def apply(self, move):
+        """
+        optional: returns state obtained by making move from _scored_moves, only called for moves actually taken
+        may return None if move turns out to be invalid
+        """
+        return move
+
     @property
     def heuristic(self):
         return self._heuristic()
@@ -54,7 +78,7 @@ class QueueState:
 
     def __hash__(self):
         """
-        must implement hash function for saving visited states
+        must implement hash function (and matching __eq__) for saving visited states
         """
         raise NotImplementedError
 
@@ -90,63 +114,80 @@ class PathSearchState(QueueState):
         return f"PathSearchState(path = {self.path}, cost={self.heuristic})"
 
 class StateIterator:
-    NUM_CANDS_SAVED = 10
+    """
+    iterates over states reachable from state, in order of increasing heuristic
+    all moves are generated and scored once when the iterator is created, but the next state is only
+    built when it is returned by get_next()
+
+    parent is the iterator whose move produced state, only held by a weak reference so that a search with a bounded
+    frontier can hand the move back to the parent if this iterator is pruned, without keeping all ancestors alive
+    """
 
-    def __init__(self, state):
+    def __init__(self, state, depth=0, parent=None, move=None):
         self.state = state
-        self.idx = 0
-        self.cur_candidates =[]
-        try:
-            self.next_candidate = self._get_next()
-            self.has_next = True
-        except:
-            self.next_candidate = None
-            self.has_next = False
+        self.depth = depth # number of moves from initial state
+        self.parent = weakref.ref(parent) if parent is not None else None
+        self.move = move
+        self.last_move = None
+        # sorted by decreasing heuristic, so best move is popped from the end (sort is stable, so ties keep move order)
+        self.scored_moves = sorted(state.scored_moves, key=itemgetter(0))[::-1]
 
-    def get_next(self):
-        """
-        return next candidate, retrieves the one after that and stores in self.next_candidate
-        """
-        next_candidate = self.next_candidate
-        try:
-            self.next_candidate = self._get_next()
-        except:
-            self.has_next = False
-            self.next_candidate = None
-        return next_candidate
+    @property
+    def has_next(self):
+        return len(self.scored_moves) > 0
 
-    def _get_next(self):
+    @property
+    def next_heuristic(self):
+        return self.scored_moves[-1][0] if self.scored_moves else None
+
+    def get_next(self):
         """
-        maintains list of next self.NUM_CANDS_SAVED candidates
-        after this runs out, generates all candidates and selects next sequence
-        avoids storing entire candidate list in memory, but at cost of recomputing (hopefully not too often)
+        return next state, building it from its move (None if move is invalid)
         """
-        if self.idx % self.NUM_CANDS_SAVED == 0:
-            all_candidates = self._generate_candidates()
-            self.cur_candidates = all_candidates[self.idx:self.idx + self.NUM_CANDS_SAVED]
-        self.idx += 1
-        return self.cur_candidates[(self.idx - 1) % self.NUM_CANDS_SAVED]
+        _, move = self.scored_moves.pop()
+        self.last_move = move
+        return self.state.apply(move)
 
-    def _generate_candidates(self):
+    def add_move(self, heuristic, move):
         """
-        generates a list of all possible states that can reached from this state, in order of decreasing heuristic
+        puts move back, eg after the state it leads to was pruned from the frontier
         """
-        candidates = []
-
-        for state in self.state.moves:
-            candidates.append(state)
-
-        return sorted(candidates)
+        # binary search for the first move with lower heuristic (bisect only takes a key from python 3.10 on)
+        lo, hi = 0, len(self.scored_moves)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.scored_moves[mid][0] < heuristic:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.scored_moves.insert(lo, (heuristic, move))
 
     def __lt__(self, other):
-        if self.next_candidate is None:
+        if not self.has_next:
             return True
-        if other.next_candidate is None:
+        if not other.has_next:
             return False
-        return self.next_candidate < other.next_candidate
+        return self.next_heuristic < other.next_heuristic
 
 
 class PrioritySearch:
+    def __init__(self, budget=None, on_improved=None, stats=None, max_frontier=None, max_visited=None):
+        """
+        budget: optional SearchBudget, limits the search (otherwise stops after MAX_ITERS iterations)
+        on_improved: optional callback, called with each new best state so far
+        stats: optional SearchStats, counts moves tried and heap and visited set operations
+        max_frontier: maximum number of states in the priority queue (None = unbounded), see _prune
+        max_visited: maximum number of visited fingerprints kept, oldest are forgotten first (None = unbounded)
+
+        visited states are remembered by their hash only (a 64 bit fingerprint for crossword states), so a visited
+        state can be freed as soon as it leaves the queue; together with max_frontier and max_visited this keeps
+        the memory used by the search bounded
+        """
+        self.budget = budget
+        self.on_improved = on_improved
+        self.stats = stats
+        self.max_frontier = max_frontier
+        self.max_visited = max_visited
 
     def search(self, initial_state):
         """
@@ -160,39 +201,105 @@ class PrioritySearch:
 
         """
 
+        stats = self.stats
         initial_state_iterator = StateIterator(initial_state)
-        queue = [initial_state_iterator]
-        visited = {initial_state}
+        # initial state has no moves if eg all its cells are already filled in
+        queue = [initial_state_iterator] if initial_state_iterator.has_next else []
+        visited = {hash(initial_state)}
+        visited_order = deque([hash(initial_state)]) if self.max_visited is not None else None
+        max_queue = None if self.max_frontier is None else self.max_frontier + int(PRUNE_SLACK * self.max_frontier)
         best_so_far = initial_state
         iters = 0
 
         while queue:
             cur_state_iterator = heappop(queue)
             next_state = cur_state_iterator.get_next()
+            if stats is not None:
+                stats.count('heap_pop')
+                stats.count('place')
+                stats.count('place_rejected', next_state is None)
+            if next_state is None:
+                if cur_state_iterator.has_next:
+                    heappush(queue, cur_state_iterator)
+                    if stats is not None:
+                        stats.count('heap_push')
+                continue
 
             if next_state.done:
+                if self.on_improved is not None:
+                    self.on_improved(next_state)
                 return next_state
 
-            if next_state not in visited:
-                visited.add(next_state)
-                next_state_iterator = StateIterator(next_state)
+            fingerprint = hash(next_state)
+            if fingerprint not in visited:
+                visited.add(fingerprint)
+                if visited_order is not None:
+                    visited_order.append(fingerprint)
+                    if len(visited_order) > self.max_visited:
+                        visited.discard(visited_order.popleft())
+                next_state_iterator = StateIterator(next_state, cur_state_iterator.depth + 1, cur_state_iterator,
+                                                    cur_state_iterator.last_move)
+                if stats is not None:
+                    stats.expand(next_state_iterator.depth)
                 if next_state_iterator.has_next:
                     heappush(queue, next_state_iterator)
+                    if stats is not None:
+                        stats.count('heap_push')
+            elif stats is not None:
+                stats.count('visited_hit')
 
             if cur_state_iterator.has_next:
                 heappush(queue, cur_state_iterator)
+                if stats is not None:
+                    stats.count('heap_push')
+
+            if max_queue is not None and len(queue) > max_queue:
+                queue = self._prune(queue, visited)
 
             if next_state < best_so_far:
                 best_so_far = next_state
+                if self.on_improved is not None:
+                    self.on_improved(best_so_far)
             if iters % PRINT_FREQ == 0 and log.level == logging.DEBUG:
                 next_state.print()
                 print(f"iteration: {iters}/{MAX_ITERS}")
-            if iters > MAX_ITERS:
+            if stats is not None and iters % stats.trace_freq == 0:
+                stats.progress(iters, depth=cur_state_iterator.depth + 1, queue_size=len(queue), visited=len(visited),
+                               value=best_so_far.heuristic)
+            if self._exhausted(iters):
                 return best_so_far
             iters += 1
 
         return best_so_far
 
+    def _prune(self, queue, visited):
+        """
+        keeps the max_frontier best iterators of queue (SMA*-style): the move leading to each pruned state is handed
+        back to its parent, if the parent is still in the queue, with the heuristic of the best move the pruned
+        state had left
+        every pruned state is removed from visited so it can be generated again, also when its parent is pruned
+        too: the parent's move is then handed back to an ancestor, which leads to the pruned state again
+        returns new queue
+        """
+        kept = nsmallest(self.max_frontier, queue)
+        kept_ids = {id(state_iterator) for state_iterator in kept}
+        for state_iterator in queue:
+            if id(state_iterator) in kept_ids:
+                continue
+            parent = state_iterator.parent() if state_iterator.parent is not None else None
+            if parent is not None and id(parent) in kept_ids:
+                parent.add_move(state_iterator.next_heuristic, state_iterator.move)
+            visited.discard(hash(state_iterator.state))
+        heapify(kept)
+        if self.stats is not None:
+            self.stats.count('frontier_pruned', len(queue) - len(kept))
+        return kept
+
+    def _exhausted(self, iters):
+        if self.budget is None:
+            return iters > MAX_ITERS
+        return self.budget.exhausted(iters, MAX_ITERS)
+
 def grid_search_test():
 
     import numpy as np
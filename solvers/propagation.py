@@ -0,0 +1,85 @@
+"""
+constraint propagation over the crossing graph
+
+a candidate of an entry is unsupported by a crossing entry if no remaining candidate of the crossing has the same
+letter in the shared cell, so placing it would empty that crossing's domain (ie, exclude it)
+given a budget of b more excluded entries, a candidate unsupported by more than b crossings can never be part of a
+solution and is removed.  for b = 0 this is ordinary arc consistency (AC-3)
+
+entries with no remaining candidates (excluded or already exhausted) are unconstrained and support everything
+"""
+from collections import deque
+
+
+def revise(entry, remaining_candidates, crossings, letter_masks, budget):
+    """
+    returns domain of entry with all candidates removed that are unsupported by more than budget crossings
+    """
+    mask = remaining_candidates[entry]
+    if budget < 0:
+        return 0
+    if budget >= len(crossings[entry]):
+        return mask
+
+    # at_least[j] = candidates unsupported by at least j of the crossings seen so far
+    at_least = [mask] + [0] * (budget + 1)
+    for _entry, i1, i2 in crossings[entry]:
+        cross_mask = remaining_candidates.get(_entry)
+        if not cross_mask:
+            continue
+        supported = 0
+        for l, m in letter_masks[_entry][i2].items():
+            if cross_mask & m:
+                supported |= letter_masks[entry][i1].get(l, 0)
+        unsupported = mask & ~supported
+        if not unsupported:
+            continue
+        for j in range(budget + 1, 0, -1):
+            at_least[j] |= at_least[j - 1] & unsupported
+
+    return mask & ~at_least[budget + 1]
+
+
+def propagate(state, changed, max_excluded):
+    """
+    propagates domain changes of entries in 'changed' through the crossing graph
+
+    state must provide remaining_candidates, crossings, letter_masks, num_excluded, stats and set_candidates(entry, mask)
+    entries whose domains empty out are removed and counted in state.num_excluded
+    returns False as soon as state.num_excluded exceeds max_excluded, state is then only partially propagated
+    """
+    if max_excluded is None:
+        return True
+    if state.num_excluded > max_excluded:
+        return False
+
+    stats = state.stats
+    queue = deque(changed)
+    in_queue = set(changed)
+    while queue:
+        changed_entry = queue.popleft()
+        in_queue.discard(changed_entry)
+        for entry, _, _ in state.crossings[changed_entry]:
+            mask = state.remaining_candidates.get(entry)
+            if not mask:
+                continue
+            new_mask = revise(entry, state.remaining_candidates, state.crossings, state.letter_masks,
+                              max_excluded - state.num_excluded)
+            if stats is not None:
+                stats.count('revise')
+            if new_mask == mask:
+                continue
+            if stats is not None:
+                stats.count('revise_pruned')
+            if new_mask:
+                state.set_candidates(entry, new_mask)
+            else:
+                state.set_candidates(entry, None)
+                state.num_excluded += 1
+                if state.num_excluded > max_excluded:
+                    return False
+            if entry not in in_queue:
+                queue.append(entry)
+                in_queue.add(entry)
+
+    return True
@@ -0,0 +1,37 @@
+"""
+restart schedules for the backtracking solver
+
+a schedule is an infinite iterator over the number of search nodes to allow before each restart
+    - 'luby': base times the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8, ...
+      within a constant factor of the optimal schedule when nothing is known about the runtime distribution
+    - 'geometric': base, base * factor, base * factor^2, ...
+"""
+from itertools import count
+
+RESTART_BASE = 500
+RESTART_FACTOR = 1.5
+SCHEDULES = ['luby', 'geometric']
+
+
+def luby(i):
+    """
+    i-th term of the Luby sequence, starting from i = 1
+    """
+    while True:
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+def restart_cutoffs(schedule='luby', base=RESTART_BASE, factor=RESTART_FACTOR):
+    """
+    returns iterator over number of nodes between restarts for given schedule (see above)
+    """
+    if schedule == 'luby':
+        return (base * luby(i) for i in count(1))
+    if schedule == 'geometric':
+        return (int(base * factor ** i) for i in count())
+    raise ValueError(f"unknown restart schedule {schedule}, must be one of {SCHEDULES}")
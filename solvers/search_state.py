@@ -0,0 +1,211 @@
+import logging
+log = logging.getLogger("crossword_logger")
+
+from solvers.grid_state import GridState, popcount, encode, fits, EMPTY, EXCLUDED_WEIGHT
+from solvers.propagation import propagate
+
+
+class SearchState:
+    """
+    mutable counterpart of GridState, used by the backtracking solver
+
+    place() modifies the grid and candidate domains in place and records every change on an undo trail,
+    undo() restores the state from before the most recent successful place() in O(number of changes)
+    so only a single grid is kept in memory regardless of search depth
+    """
+    def __init__(self, grid_state):
+
+        # grid state data
+        self.cells = bytearray(grid_state.cells)
+        self.remaining_candidates = dict(grid_state.remaining_candidates)
+        self.entry_order = grid_state.entry_order.copy()
+        self.num_excluded = grid_state.num_excluded
+        self.num_empty = grid_state.num_empty
+
+        # global grid information
+        self.all_candidates = grid_state.all_candidates
+        self.crossings = grid_state.crossings
+        self.letter_masks = grid_state.letter_masks
+        self.entry_slices = grid_state.entry_slices
+        self.zobrist_table = grid_state.zobrist_table
+        self.stats = grid_state.stats
+        self.width, self.height = grid_state.width, grid_state.height
+
+        # hash of filled cells, and of the set of entries no longer in remaining_candidates (placed or excluded)
+        self.zobrist_hash = grid_state.zobrist_hash or 0
+        self.decided_hash = 0
+        if self.zobrist_table is not None:
+            for entry in self.all_candidates:
+                if entry not in self.remaining_candidates:
+                    self.decided_hash ^= self.zobrist_table[entry]
+
+        # undo information:
+        #  domain_trail holds (entry, old_mask) for every domain change, old_mask None if entry was not in remaining_candidates
+        #  cell_trail holds index of every cell filled in
+        #  marks holds trail lengths and counters at the start of each placement
+        self.domain_trail = []
+        self.cell_trail = []
+        self.marks = []
+
+        # entries whose domains changed during the last failed place() or exclude() before it was undone,
+        # None if word did not fit in the grid (used for conflict analysis by the backtracking solver)
+        self.conflict_entries = []
+
+    def get_entry(self, entry):
+        return self.cells[self.entry_slices[entry]].decode('ascii')
+
+    def next_entry(self):
+        """
+        most constrained remaining entry that still has candidates to try, None if there is none
+        """
+        return self.entry_order.min_entry(min_size=1)
+
+    def _set_mask(self, entry, mask):
+        if self.zobrist_table is not None and (mask is None) == (entry in self.remaining_candidates):
+            self.decided_hash ^= self.zobrist_table[entry]
+        if mask is None:
+            self.remaining_candidates.pop(entry, None)
+            self.entry_order.discard(entry)
+        else:
+            self.remaining_candidates[entry] = mask
+            self.entry_order.update(entry, popcount(mask))
+
+    def set_candidates(self, entry, mask):
+        """
+        sets domain of entry (None removes entry), recording old value on the trail
+        """
+        self.domain_trail.append((entry, self.remaining_candidates.get(entry)))
+        self._set_mask(entry, mask)
+
+    def propagate(self, entries, max_excluded=None):
+        """
+        prunes candidates not supported by crossing entries (see propagation.py), starting from given entries
+        changes are recorded on the trail, returns False if more than max_excluded entries end up excluded
+        """
+        return propagate(self, entries, max_excluded)
+
+    def place(self, word, entry, max_excluded=None):
+        """
+        tries to place word in entry, returns True if successful
+        if max_excluded is given, fails if more than max_excluded entries end up excluded, after propagating
+        the resulting domain changes through the crossing graph
+        on failure the state is left unchanged
+        """
+        entry_slice = self.entry_slices[entry]
+        word_bytes = encode(word)
+        cur = self.cells[entry_slice]
+        if not fits(word_bytes, cur):
+            self.conflict_entries = None
+            return False
+
+        self.checkpoint()
+
+        if entry in self.remaining_candidates:
+            self.set_candidates(entry, None)
+
+        # check crossings to see what candidates are eliminated
+        if self.stats is not None:
+            self.stats.count('crossing_checks', len(self.crossings[entry]))
+        changed = []
+        for _entry, i1, i2 in self.crossings[entry]:
+            if _entry not in self.remaining_candidates:
+                continue
+            old_mask = self.remaining_candidates[_entry]
+            new_mask = old_mask & self.letter_masks[_entry][i2].get(word[i1], 0)
+            # an entry whose candidates have all been tried (domain 0) is excluded too
+            if new_mask and new_mask == old_mask:
+                continue
+            changed.append(_entry)
+            if new_mask:
+                self.set_candidates(_entry, new_mask)
+            else:
+                self.set_candidates(_entry, None)
+                self.num_excluded += 1
+
+        # fill in letters
+        if EMPTY in cur:
+            for i, idx in enumerate(range(entry_slice.start, entry_slice.stop, entry_slice.step)):
+                if cur[i] == EMPTY:
+                    self.cell_trail.append(idx)
+                    if self.zobrist_table is not None:
+                        self.zobrist_hash ^= self.zobrist_table[(idx, word[i])]
+            self.num_empty -= cur.count(EMPTY)
+            self.cells[entry_slice] = word_bytes
+
+        if not self.propagate(changed, max_excluded):
+            self._fail()
+            return False
+        return True
+
+    def exclude(self, entry, max_excluded=None):
+        """
+        decides that entry will not come from its candidate list (its letters are left to the crossing entries)
+        returns False, leaving the state unchanged, if this would exceed max_excluded
+        """
+        if max_excluded is not None and self.num_excluded >= max_excluded:
+            self.conflict_entries = []
+            return False
+
+        self.checkpoint()
+        if entry in self.remaining_candidates:
+            self.set_candidates(entry, None)
+        self.num_excluded += 1
+
+        # budget is now tighter, so crossing entries may lose more candidates
+        if not self.propagate([entry], max_excluded):
+            self._fail()
+            return False
+        return True
+
+    def _fail(self):
+        # undoes failed place() or exclude(), remembering which entries it changed
+        self.conflict_entries = [entry for entry, _ in self.domain_trail[self.marks[-1][0]:]]
+        self.undo()
+
+    def checkpoint(self):
+        """
+        starts a new level on the trail, everything changed after this is reverted by the next undo()
+        """
+        self.marks.append((len(self.domain_trail), len(self.cell_trail), self.num_excluded, self.num_empty, self.zobrist_hash))
+
+    def undo(self):
+        """
+        reverts all changes since the most recent checkpoint (ie, the most recent successful place() or exclude())
+        """
+        domain_mark, cell_mark, self.num_excluded, self.num_empty, self.zobrist_hash = self.marks.pop()
+
+        while len(self.domain_trail) > domain_mark:
+            entry, old_mask = self.domain_trail.pop()
+            self._set_mask(entry, old_mask)
+
+        while len(self.cell_trail) > cell_mark:
+            self.cells[self.cell_trail.pop()] = EMPTY
+
+    @property
+    def node_key(self):
+        """
+        identifies the subproblem at the current node: which cells are filled with what, and which entries are decided
+        """
+        return self.zobrist_hash ^ self.decided_hash
+
+    @property
+    def depth(self):
+        return len(self.marks)
+
+    def value(self, excluded_weight=EXCLUDED_WEIGHT):
+        return self.num_empty + excluded_weight * self.num_excluded
+
+    @property
+    def is_filled(self):
+        return self.num_empty == 0
+
+    def to_grid_state(self):
+        """
+        returns immutable GridState copy of current state
+        """
+        return GridState(bytearray(self.cells), self.width, self.remaining_candidates, self.all_candidates, self.crossings,
+                         self.letter_masks, self.entry_slices, num_excluded=self.num_excluded, num_empty=self.num_empty, entry_order=self.entry_order.copy(),
+                         zobrist_table=self.zobrist_table, zobrist_hash=self.zobrist_hash, stats=self.stats)
+
+    def print(self):
+        self.to_grid_state().print()
@@ -0,0 +1,94 @@
+"""
+counters and timers for the solver hot paths, with an optional JSONL trace of the search
+
+solvers, search states and PrioritySearch hold a SearchStats object, or None when instrumentation is disabled,
+so a disabled hot path only costs a check for None
+
+counters (names used by the solvers):
+    place, place_rejected: placements tried, and those that failed (word does not fit or too many exclusions)
+    exclude, exclude_rejected: same for excluding entries (backtracking only)
+    crossing_checks: crossing entries filtered when placing a word
+    revise, revise_pruned: domains revised during propagation, and those that lost candidates
+    heap_push, heap_pop, visited_hit: priority queue operations, and next states skipped as already visited
+    frontier_pruned: states dropped from the priority queue to keep it within max_frontier (priority search only)
+    refuted_hit: nodes skipped because they were refuted in an earlier pass (backtracking only)
+    backjump, backjump_levels, nogood_hit: backjumps, levels skipped by them, and decisions skipped by nogoods
+    restart: restarts of a pass of the backtracking search
+    split: nodes where the undecided entries fell apart into independent regions (backtracking only)
+    move, move_rejected: moves made by local search, and moves that would increase the cost rejected by annealing
+expansions per depth: number of nodes expanded at each search depth
+timers: seconds spent in clue model generation, setup of the initial grid and search (clue_model, setup, search)
+
+trace: one json object per line, each with the event name and the seconds since the SearchStats was created
+    {'event': 'start', 'time', 'solver', 'width', 'height'}, plus 'changed_cells' when solving again (see resolve)
+    {'event': 'progress', 'time', 'iters', 'counts', ...}, every trace_freq iterations, with fields of the solver:
+        backtracking: 'k', 'depth', 'value'
+        priority search: 'depth', 'queue_size', 'visited', 'value'
+        local search: 'value', 'cost', 'excluded'
+    {'event': 'end', 'time', 'value', 'stop_reason', 'counts', 'expansions', 'timers'}
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+import json
+import time
+
+TRACE_FREQ = 1000
+
+
+class SearchStats:
+    def __init__(self, trace_path=None, trace_freq=TRACE_FREQ):
+        """
+        trace_path: if given, events are appended to this file as json lines
+        trace_freq: number of search iterations between 'progress' events in the trace
+        """
+        self.counts = Counter()
+        self.expansions = Counter()
+        self.timers = defaultdict(float)
+        self.trace_freq = trace_freq
+        self.trace_path = trace_path
+        self.trace_file = open(trace_path, 'a') if trace_path is not None else None
+        self.start_time = time.time()
+
+    def count(self, name, n=1):
+        self.counts[name] += n
+
+    def expand(self, depth):
+        self.expansions[depth] += 1
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def trace(self, event, **fields):
+        """
+        writes event with given fields to the trace file, if there is one
+        """
+        if self.trace_file is None:
+            return
+        record = {'event': event, 'time': round(time.time() - self.start_time, 6), **fields}
+        self.trace_file.write(json.dumps(record) + '\n')
+
+    def progress(self, iters, **fields):
+        """
+        writes 'progress' event with current counters, called by solvers every trace_freq iterations
+        """
+        self.trace('progress', iters=iters, counts=dict(self.counts), **fields)
+
+    def as_dict(self):
+        return {'counts': dict(self.counts), 'expansions': dict(sorted(self.expansions.items())),
+                'timers': dict(self.timers)}
+
+    def close(self):
+        if self.trace_file is not None:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def __getstate__(self):
+        # copies sent to worker processes only count, they do not write to the trace
+        state = dict(self.__dict__)
+        state['trace_file'] = None
+        return state
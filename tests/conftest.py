@@ -0,0 +1,10 @@
+import pytest
+
+import clue_models.base_clue_solver as base_clue_solver
+
+
+@pytest.fixture(autouse=True)
+def candidates_path(tmp_path, monkeypatch):
+    # keep candidates generated by the tests out of the data folder
+    monkeypatch.setattr(base_clue_solver, 'CANDIDATES_PATH', str(tmp_path) + '/')
+    return tmp_path
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver
+from solvers.stats import SearchStats
+
+CONFIGS = {'plain': {'backjump': False, 'decompose': False},
+           'backjump': {'backjump': True, 'decompose': False},
+           'decompose': {'backjump': False, 'decompose': True},
+           'restarts': {'restarts': 'luby', 'restart_base': 20, 'seed': 1},
+           'default': {}}
+PUZZLES = [(7, 0.3, 1), (7, 0.3, 2), (9, 0.3, 0), (9, 0.3, 3), (9, 0.3, 4), (11, 0.2, 0), (11, 0.3, 3)]
+
+
+def backtrack_solve(size, noise, puz_seed, **kwargs):
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False, clue_model_kwargs={'noise': noise},
+                             **kwargs)
+    np.random.seed(puz_seed)
+    sol, _ = solver.solve_puz(make_puzzle(size, puz_seed))
+    return solver, sol
+
+
+@pytest.mark.parametrize('size, noise, seed', PUZZLES)
+def test_configs_find_same_optimum(size, noise, seed):
+    # A_k returns a grid with the fewest excluded entries, whatever the search strategy
+    results = {}
+    for name, kwargs in CONFIGS.items():
+        solver, sol = backtrack_solve(size, noise, seed, **kwargs)
+        assert sol.is_complete and solver.budget.reason is None
+        results[name] = sol.num_excluded
+    assert len(set(results.values())) == 1, results
+
+    # and no complete grid exists with one fewer excluded entry
+    k = results['default']
+    if k > 0:
+        _, sol = backtrack_solve(size, noise, seed, max_excluded=k - 1)
+        assert sol is None or not sol.is_complete
+
+
+def test_pruning_is_exercised():
+    # the puzzles above actually hit the refuted table, nogoods, backjumps and splits
+    counts = {}
+    for size, noise, seed in PUZZLES:
+        for kwargs in ({'backjump': True, 'decompose': False}, {}):
+            stats = SearchStats()
+            backtrack_solve(size, noise, seed, stats=stats, **kwargs)
+            for name in ('refuted_hit', 'nogood_hit', 'backjump', 'split'):
+                counts[name] = counts.get(name, 0) + stats.counts[name]
+    assert all(counts.values()), counts
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver, PrioritySolver
+
+
+def oracle_solve(solver_type, size, noise, seed, fill=None):
+    p = make_puzzle(size, seed)
+    if fill is not None:
+        p.fill = fill
+    solver = solver_type(clue_model_type='oracle', load_candidates=False, clue_model_kwargs={'noise': noise})
+    np.random.seed(seed)
+    sol, _ = solver.solve_puz(p)
+    return solver, sol, p
+
+
+def keeps_letters(sol, fill):
+    return all(c in '-.' or sol.cells[i] == ord(c.lower()) for i, c in enumerate(fill))
+
+
+@pytest.mark.parametrize('solver_type', [BacktrackSolver, PrioritySolver])
+@pytest.mark.parametrize('size, noise, seed', [(7, 0.3, 1), (9, 0.3, 0), (11, 0.3, 3)])
+def test_resolve(solver_type, size, noise, seed):
+    solver, _, p = oracle_solve(solver_type, size, noise, seed)
+
+    # the user types the correct letters of a few cells, then overwrites one of them
+    rng = np.random.RandomState(seed)
+    white = [i for i, c in enumerate(p.solution) if c != '.']
+    fill = list(p.fill)
+    typed = rng.choice(white, 6, replace=False)
+    for i in typed:
+        fill[i] = p.solution[i]
+    added = ''.join(fill)
+    fill[typed[0]] = 'Q' if p.solution[typed[0]] != 'Q' else 'Z'
+    changed = ''.join(fill)
+
+    for fill, keep_learned in [(added, True), (changed, False)]:
+        sol, _ = solver.resolve([fill[r * size:(r + 1) * size] for r in range(size)])
+        assert solver.keep_learned == keep_learned
+        assert keeps_letters(sol, fill)
+
+        # same grid as solving the puzzle from scratch with those letters filled in
+        _, fresh, _ = oracle_solve(solver_type, size, noise, seed, fill=fill)
+        assert sol.cells == fresh.cells
+        assert sol.num_excluded == fresh.num_excluded
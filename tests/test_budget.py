@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver
+from solvers.budget import SearchBudget, current_rss
+
+
+class FakeGrid:
+    def __init__(self, value, is_complete):
+        self._value = value
+        self.is_complete = is_complete
+
+    def value(self):
+        return self._value
+
+
+def test_report_keeps_best_value():
+    seen = []
+    budget = SearchBudget(on_improved=seen.append)
+    grids = [FakeGrid(10, False), FakeGrid(12, False), FakeGrid(8, False)]
+    for grid in grids:
+        budget.report(grid)
+    assert seen == [grids[0], grids[2]]
+    assert budget.best is grids[2]
+
+
+def test_report_passes_first_complete_grid():
+    seen = []
+    budget = SearchBudget(on_improved=seen.append)
+    partial, complete, worse_complete = FakeGrid(5, False), FakeGrid(9, True), FakeGrid(11, True)
+    for grid in [partial, complete, worse_complete]:
+        budget.report(grid)
+    assert seen == [partial, complete]
+    assert budget.best is partial
+    assert budget.first_complete is complete
+
+
+def test_start_resets_first_complete():
+    budget = SearchBudget()
+    budget.report(FakeGrid(3, True))
+    budget.start()
+    assert budget.first_complete is None and budget.best is None
+
+
+def test_iter_solve_streams_complete_result():
+    p = make_puzzle(7, 0)
+    np.random.seed(0)
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False,
+                             clue_model_kwargs={'noise': 0.2})
+    budget = SearchBudget(time_limit=30)
+    grids = list(solver.iter_solve(p, budget))
+    assert grids[-1].is_complete
+    # the first complete grid is streamed as soon as it is found, not only returned at the end
+    assert budget.first_complete is not None
+    assert any(grid is budget.first_complete for grid in grids)
+
+
+@pytest.mark.skipif(current_rss() is None, reason="resident memory cannot be measured on this platform")
+def test_memory_limit_ignores_earlier_peak():
+    peak = b'x' * (300 << 20)
+    del peak
+    max_memory = current_rss() + (100 << 20)
+    assert not SearchBudget(max_memory=max_memory).exhausted(0)
+
+    # a budgeted solve after the peak is not stopped at the first node
+    budget = SearchBudget(max_memory=max_memory)
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False)
+    np.random.seed(0)
+    sol, _ = solver.solve_puz(make_puzzle(5, 0), budget=budget)
+    assert budget.reason != 'memory' and sol.is_complete
+
+    budget = SearchBudget(max_memory=1)
+    assert budget.exhausted(0) and budget.reason == 'memory'
@@ -0,0 +1,80 @@
+import os
+
+import clue_models.candidate_store as candidate_store
+from clue_models.candidate_store import CandidateStore, HEADER
+
+
+def test_put_get_reopen(tmp_path):
+    path = str(tmp_path / 'test.cands')
+    store = CandidateStore(path)
+    store.put_many([(0, ['UMAS', 'UMAX']), (3, []), (2, ['CAFÉ'])])
+    store.put(0, ['UMA'])
+    assert store.get(0) == ['UMA'] and store.get(3) == [] and store.get(2) == ['CAFÉ']
+    store.close()
+
+    store = CandidateStore(path)
+    assert len(store) == 3 and 1 not in store and 3 in store
+    assert [store.get(idx) for idx in [0, 2, 3]] == [['UMA'], ['CAFÉ'], []]
+    assert store.num_records == 4
+    # appended after the file was mapped
+    store.put(1, ['NEW'])
+    assert store.get(1) == ['NEW']
+    store.close()
+
+
+def test_torn_tail_is_cut_off(tmp_path):
+    path = str(tmp_path / 'test.cands')
+    store = CandidateStore(path)
+    store.put_many([(0, ['AAAA']), (1, ['BBBB'])])
+    store.close()
+    size = os.path.getsize(path)
+
+    # a record that was only partly written
+    with open(path, 'ab') as f:
+        f.write(candidate_store._record(2, ['CCCC'])[:HEADER.size + 2])
+    store = CandidateStore(path)
+    assert len(store) == 2 and store.get(1) == ['BBBB'] and os.path.getsize(path) == size
+    store.put(2, ['CCCC'])
+    store.close()
+    assert CandidateStore(path).get(2) == ['CCCC']
+
+
+def test_crc_mismatch_is_cut_off(tmp_path):
+    path = str(tmp_path / 'test.cands')
+    store = CandidateStore(path)
+    store.put_many([(0, ['AAAA']), (1, ['BBBB'])])
+    store.close()
+
+    with open(path, 'r+b') as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b'X')
+    store = CandidateStore(path)
+    assert len(store) == 1 and store.get(0) == ['AAAA'] and 1 not in store
+    store.close()
+
+    # a corrupt first record leaves an empty store
+    with open(path, 'r+b') as f:
+        f.write(b'\xff')
+    store = CandidateStore(path)
+    assert len(store) == 0 and os.path.getsize(path) == 0
+    store.close()
+
+
+def test_compaction(tmp_path, monkeypatch):
+    monkeypatch.setattr(candidate_store, 'MIN_COMPACT_RECORDS', 10)
+    path = str(tmp_path / 'test.cands')
+    store = CandidateStore(path)
+    for i in range(5):
+        store.put_many([(0, [f'A{i}']), (1, [f'B{i}'])])
+    store.close()
+    size = os.path.getsize(path)
+
+    # 10 records for 2 entries
+    store = CandidateStore(path)
+    assert store.num_records == 2 and store.get(0) == ['A4'] and store.get(1) == ['B4']
+    assert os.path.getsize(path) < size and not os.path.exists(path + '.tmp')
+    store.put(2, ['C'])
+    store.close()
+    store = CandidateStore(path)
+    assert [store.get(idx) for idx in range(3)] == [['A4'], ['B4'], ['C']]
+    store.close()
@@ -0,0 +1,91 @@
+import pytest
+
+import clue_models.clue_cache as clue_cache
+from clue_models.clue_cache import ClueCache
+
+
+def entry(clue, length=4):
+    return {'clue': clue, 'length': length}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(clue_cache.time, 'time', clock)
+    return clock
+
+
+def make_cache(tmp_path, **kwargs):
+    return ClueCache(str(tmp_path / 'cache.sqlite'), **kwargs)
+
+
+def last_used(cache, clue):
+    return cache.conn.execute('SELECT last_used FROM clues WHERE clue = ?', (clue,)).fetchone()[0]
+
+
+def test_get_put(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put('web', [entry('Actress  Thurman'), entry('Actress Thurman', 5)], [['UMAS', 'UMAX'], ['UMAXX']], 2)
+    assert cache.get('web', [entry('actress thurman'), entry('ACTRESS THURMAN', 5), entry('Actress Thurman?')], 1) \
+        == [['UMAS'], ['UMAXX'], None]
+    # other models, and more candidates than were asked for, are not cached
+    assert cache.get('bert', [entry('Actress Thurman')], 2) == [None]
+    assert cache.get('web', [entry('Actress Thurman')], 3) == [None]
+
+
+def test_ttl(tmp_path, clock):
+    cache = make_cache(tmp_path, ttl=100, evict_interval=1)
+    cache.put('web', [entry('a')], [['AAAA']], 1)
+    clock.now += 99
+    assert cache.get('web', [entry('a')], 1) == [['AAAA']]
+    clock.now += 2
+    assert cache.get('web', [entry('a')], 1) == [None]
+
+    # expired rows are deleted at the next eviction
+    cache.put('web', [entry('b')], [['BBBB']], 1)
+    assert [clue for (clue,) in cache.conn.execute('SELECT clue FROM clues')] == ['b']
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2, evict_interval=1)
+    cache.put('web', [entry('a')], [['AAAA']], 1)
+    clock.now += clue_cache.TOUCH_INTERVAL
+    cache.put('web', [entry('b')], [['BBBB']], 1)
+    clock.now += clue_cache.TOUCH_INTERVAL + 1
+    assert cache.get('web', [entry('a')], 1) == [['AAAA']]
+    cache.put('web', [entry('c')], [['CCCC']], 1)
+    assert cache.get('web', [entry(clue) for clue in 'abc'], 1) == [['AAAA'], None, ['CCCC']]
+
+
+def test_touch_interval(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    cache.put('web', [entry('a')], [['AAAA']], 1)
+    put_time = clock.now
+    clock.now += clue_cache.TOUCH_INTERVAL - 1
+    cache.get('web', [entry('a')], 1)
+    assert last_used(cache, 'a') == put_time
+    clock.now += 2
+    cache.get('web', [entry('a')], 1)
+    assert last_used(cache, 'a') == clock.now
+
+
+def test_evict_interval(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=1, evict_interval=3)
+
+    def num_rows():
+        return cache.conn.execute('SELECT COUNT(*) FROM clues').fetchone()[0]
+
+    # first put evicts, then every 3 rows put
+    cache.put('web', [entry('a')], [['AAAA']], 1)
+    cache.put('web', [entry('b'), entry('c')], [['BBBB'], ['CCCC']], 1)
+    assert num_rows() == 3
+    cache.put('web', [entry('d')], [['DDDD']], 1)
+    assert num_rows() == 1
@@ -0,0 +1,86 @@
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+import clue_models.base_clue_solver as base_clue_solver
+from benchmarks.solver_benchmark import make_puzzle
+from clue_models.base_clue_solver import ClueSolver
+from clue_models.bert_solver import BERTSolver
+from clue_models.clue_cache import ClueCache
+from clue_models.oracle_solver import OracleSolver
+from solvers import BacktrackSolver
+
+ENTRIES = [{'cell': 0, 'AD': 'A', 'length': 4, 'clue': 'Actress Thurman'}]
+
+
+class FixedSolver(ClueSolver):
+    MODEL_NAME = 'fixed'
+
+    def __init__(self, answer, model_key=None, puzname='test', **kwargs):
+        super().__init__(**kwargs)
+        self.answer = answer
+        if model_key is not None:
+            self.model_key = model_key
+        self.generate_candidates(ENTRIES, puzname)
+
+    def find_clue(self, entry):
+        return [self.answer]
+
+
+def test_model_key_separates_cache_and_store(tmp_path, candidates_path):
+    cache = ClueCache(str(tmp_path / 'cache.sqlite'))
+    assert FixedSolver('UMAS', cache=cache).candidates == {0: ['UMAS']}
+    # from the cache
+    assert FixedSolver('XXXX', puzname='other', cache=cache).candidates == {0: ['UMAS']}
+    assert FixedSolver('XXXX', model_key='fixed_other', cache=cache).candidates == {0: ['XXXX']}
+    # from the candidate store
+    assert FixedSolver('YYYY', cache=False).candidates == {0: ['UMAS']}
+    assert FixedSolver('YYYY', model_key='fixed_other', cache=False).candidates == {0: ['XXXX']}
+    assert sorted(name for name in os.listdir(candidates_path) if name.endswith('.cands')) \
+        == ['other_fixed.cands', 'test_fixed.cands', 'test_fixed_other.cands']
+
+
+def test_no_cache_without_load(tmp_path):
+    cache = ClueCache(str(tmp_path / 'cache.sqlite'))
+    FixedSolver('UMAS', cache=cache)
+    solver = FixedSolver('XXXX', puzname='other', load=False, cache=cache)
+    assert solver.candidates == {0: ['XXXX']} and solver.cache is None
+    # nor written to
+    assert FixedSolver('YYYY', puzname='third', cache=cache).candidates == {0: ['UMAS']}
+
+
+def test_close(tmp_path, monkeypatch):
+    cache = ClueCache(str(tmp_path / 'cache.sqlite'))
+    with FixedSolver('UMAS', cache=cache):
+        pass
+    # a cache passed in stays open
+    assert cache.get('fixed', ENTRIES, 1) == [['UMAS']]
+
+    monkeypatch.setattr(base_clue_solver, 'ClueCache', lambda: cache)
+    solver = FixedSolver('UMAS')
+    solver.close()
+    assert solver.cache is None
+    with pytest.raises(sqlite3.ProgrammingError):
+        cache.get('fixed', ENTRIES, 1)
+
+
+def test_solve_puz_closes_clue_model(monkeypatch):
+    closed = []
+    monkeypatch.setattr(OracleSolver, 'close', lambda self: closed.append(self))
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False)
+    np.random.seed(0)
+    _, clue_model = solver.solve_puz(make_puzzle(5, 0))
+    assert closed == [clue_model]
+
+def test_bert_model_key(tmp_path):
+    solver = BERTSolver.__new__(BERTSolver)
+    checkpoint = tmp_path / 'model.ckpt'
+    checkpoint.write_bytes(b'weights')
+    keys = [solver._model_key('bert-base-uncased', None), solver._model_key('org/bert-large', None),
+            solver._model_key('bert-base-uncased', str(checkpoint))]
+    os.utime(checkpoint, (0, 0))
+    keys.append(solver._model_key('bert-base-uncased', str(checkpoint)))
+    assert keys[:2] == ['bert_bert-base-uncased', 'bert_org-bert-large']
+    assert len(set(keys)) == 4 and all('/' not in key for key in keys)
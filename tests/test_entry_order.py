@@ -0,0 +1,40 @@
+from solvers.entry_order import EntryOrder
+
+
+def test_min_entry_and_order():
+    order = EntryOrder([('a', 3), ('b', 1), ('c', 3), ('d', 0)])
+    assert list(order) == ['d', 'b', 'a', 'c']
+    assert order.min_entry() == 'd'
+    assert order.min_entry(min_size=1) == 'b'
+    assert list(order.min_bucket(min_size=2)) == ['a', 'c']
+    assert order.min_entry(min_size=4) is None and order.min_bucket(min_size=4) is None
+
+
+def test_update_remove():
+    order = EntryOrder([('a', 3), ('b', 1)])
+    order.update('a', 0)
+    order.update('b', 1)
+    order.update('c', 5)
+    assert list(order) == ['a', 'b', 'c']
+    order.remove('a')
+    order.discard('a')
+    order.discard('b')
+    assert 'a' not in order and 'c' in order and len(order) == 1
+    assert order.min_entry() == 'c'
+
+
+def test_copy_is_independent():
+    order = EntryOrder([('a', 2), ('b', 2)])
+    new = order.copy()
+    new.update('b', 1)
+    new.remove('a')
+    assert list(order) == ['a', 'b'] and list(new) == ['b']
+
+
+def test_shuffled_keeps_sizes():
+    order = EntryOrder([(i, i % 3) for i in range(30)])
+    shuffled = order.shuffled(0)
+    assert shuffled.sizes == order.sizes
+    assert list(shuffled) != list(order)
+    assert [shuffled.sizes[entry] for entry in shuffled] == sorted(order.sizes.values())
+    assert list(order.shuffled(0)) == list(shuffled)
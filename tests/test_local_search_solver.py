@@ -0,0 +1,121 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import LocalSearchSolver
+from solvers.budget import SearchBudget
+from solvers.local_search_solver import _IndexedSet, EXCLUDED
+from solvers.stats import SearchStats
+
+
+class RecordedValues(list):
+    """
+    assignment of the local search, recording (step, entry, old value, new value) of every change
+    """
+    def __setitem__(self, e, v):
+        self.changes.append((self.budget.nodes, e, self[e], v))
+        super().__setitem__(e, v)
+
+
+def local_search(max_nodes, noise=0.3, stats=None, **kwargs):
+    """
+    returns (solution, solver, initial grid state) of a seeded local search with given step budget
+    """
+    solver = LocalSearchSolver(seed=1, clue_model_type='oracle', load_candidates=False, stats=stats,
+                               clue_model_kwargs={'noise': noise}, **kwargs)
+    initial = []
+    search, setup = solver._solver, solver._setup
+    solver._solver = lambda grid_state: initial.append(grid_state) or search(grid_state)
+
+    def recorded_setup(grid_state):
+        setup(grid_state)
+        solver.values = RecordedValues(solver.values)
+        solver.values.changes, solver.values.budget = [], solver.budget
+    solver._setup = recorded_setup
+    np.random.seed(0)
+    sol, _ = solver.solve_puz(make_puzzle(15, 0), budget=SearchBudget(max_nodes=max_nodes))
+    return sol, solver, initial[0]
+
+
+def num_unplaced(grid_state):
+    """
+    number of entries that do not hold one of their candidates
+    """
+    return sum(grid_state.get_entry(entry) not in cands for entry, cands in grid_state.all_candidates.items())
+
+
+@pytest.mark.parametrize('noise', [0.3, 0.5])
+def test_anytime_result(noise):
+    values = []
+    for max_nodes in [0, 10, 100, 1000, 5000]:
+        sol, solver, initial = local_search(max_nodes, noise)
+        # every entry holds one of its candidates or is excluded (an excluded entry can still be filled with a
+        # candidate by its crossing words)
+        assert sol.is_complete and num_unplaced(sol) <= sol.num_excluded
+        current = solver._grid_state(initial, solver.values)
+        assert all(current.get_entry(entry) == current.all_candidates[entry][solver.cand_idx[e][v]]
+                   for e, (entry, v) in enumerate(zip(solver.entries, solver.values)) if v != EXCLUDED)
+        # cost tracked incrementally by the moves is the value of the assignment reached
+        assert solver.cost == current.value(solver.excluded_weight)
+        assert sol.value() <= solver.cost
+        values.append(sol.value())
+    assert values == sorted(values, reverse=True) and values[-1] < values[0]
+
+
+def reversals(changes, window):
+    """
+    number of candidates placed back in an entry within window steps of being removed from it
+    """
+    removed, count = {}, 0
+    for step, e, old, new in changes:
+        if new == EXCLUDED:
+            removed[(e, old)] = step
+        elif (e, new) in removed and step < removed[(e, new)] + window:
+            count += 1
+    return count
+
+
+def test_tabu():
+    # without tabu, min-conflicts often undoes its last moves; with tabu it does not (unless that gives a new best,
+    # which does not happen in this seeded run)
+    _, solver, _ = local_search(3000, tabu_tenure=0)
+    assert reversals(solver.values.changes, 10) > 50
+    _, solver, _ = local_search(3000, tabu_tenure=10)
+    assert reversals(solver.values.changes, 10) == 0
+
+
+def test_annealing():
+    stats = SearchStats()
+    local_search(2000, stats=stats)
+    # some moves that would increase the cost are rejected by annealing
+    assert stats.counts['move'] > 0 and stats.counts['move_rejected'] > 0
+
+
+def test_indexed_set_matches_set():
+    rng = random.Random(0)
+    indexed, expected = _IndexedSet(), set()
+    for _ in range(1000):
+        item = rng.randrange(20)
+        if rng.random() < 0.5:
+            indexed.add(item)
+            expected.add(item)
+        else:
+            indexed.discard(item)
+            expected.discard(item)
+        assert len(indexed) == len(expected) and set(indexed.items) == expected
+        assert all(indexed.items[idx] == item for item, idx in indexed.index.items())
+        if expected:
+            assert indexed.choice(rng) in expected
+
+
+def test_indexed_set_choice_is_uniform():
+    indexed = _IndexedSet()
+    for item in 'abcd':
+        indexed.add(item)
+    rng = random.Random(0)
+    counts = {item: 0 for item in 'abcd'}
+    for _ in range(4000):
+        counts[indexed.choice(rng)] += 1
+    assert all(900 < count < 1100 for count in counts.values())
@@ -0,0 +1,41 @@
+import pickle
+import time
+
+import numpy as np
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver, PortfolioSolver
+from solvers.portfolio_solver import _snapshot, _restore
+
+
+def test_returns_best_partial_grid_at_deadline():
+    # no configuration finishes in time, the best grid streamed back by the workers is returned
+    p = make_puzzle(21, 0)
+    np.random.seed(0)
+    configs = [(BacktrackSolver, {}, None), (BacktrackSolver, {}, 1)]
+    solver = PortfolioSolver(configs=configs, num_workers=2, time_limit=1.5, clue_model_type='oracle',
+                             load_candidates=False, clue_model_kwargs={'noise': 0.3})
+    start = time.time()
+    sol, _ = solver.solve_puz(p)
+    assert sol is not None
+    assert time.time() - start < 30
+    assert sol.value() <= solver.budget.best_value
+
+
+def test_snapshot_round_trip():
+    grid_states = []
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False, clue_model_kwargs={'noise': 0.3})
+    solver._solver = lambda grid_state: grid_states.append(grid_state) or grid_state
+    np.random.seed(0)
+    solver.solve_puz(make_puzzle(21, 0))
+    initial = grid_states[0]
+    entry = initial.entry_order.min_entry()
+    grid_state = initial.place(initial.all_candidates[entry][0], entry)
+
+    snapshot = _snapshot(grid_state)
+    restored = _restore(pickle.loads(pickle.dumps(snapshot)), initial)
+    assert restored.cells == grid_state.cells and restored.remaining_candidates == grid_state.remaining_candidates
+    assert restored.value() == grid_state.value() and restored.is_complete == grid_state.is_complete
+    assert restored.zobrist_hash == grid_state.zobrist_hash and list(restored.entry_order) == list(grid_state.entry_order)
+    # only the part that changes during the search is sent
+    assert len(pickle.dumps(snapshot)) * 10 < len(pickle.dumps(grid_state))
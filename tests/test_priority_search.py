@@ -0,0 +1,52 @@
+from solvers.priority_search import QueueState, StateIterator, PrioritySearch
+
+# state -> next states, and heuristic of each state
+GRAPH = {'a': ['b', 'c'], 'b': ['d', 'f'], 'c': [], 'd': ['e'], 'e': [], 'f': []}
+HEURISTIC = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 9}
+
+
+class NamedState(QueueState):
+    def __init__(self, name):
+        self.name = name
+
+    def _moves(self):
+        return (NamedState(name) for name in GRAPH[self.name])
+
+    def _heuristic(self):
+        return HEURISTIC[self.name]
+
+    def _done(self):
+        return False
+
+    def __hash__(self):
+        return hash(self.name)
+
+
+def expand(state_iterator):
+    next_state = state_iterator.get_next()
+    return StateIterator(next_state, state_iterator.depth + 1, state_iterator, state_iterator.last_move)
+
+
+def test_prune_forgets_states_whose_parent_is_pruned():
+    a = StateIterator(NamedState('a'))
+    b = expand(a)  # a has c left
+    d = expand(b)  # b has f left
+    visited = {hash('a'), hash('b'), hash('d')}
+
+    kept = PrioritySearch(max_frontier=1)._prune([a, b, d], visited)
+
+    # b is handed back to a, d can only be reached again through b so it must not stay visited
+    assert kept == [a]
+    # with the heuristic of b's best move left (f), after c
+    assert a.scored_moves[0][0] == HEURISTIC['f'] and [state.name for _, state in a.scored_moves] == ['b', 'c']
+    assert visited == {hash('a')}
+
+
+def test_add_move_keeps_order():
+    state_iterator = StateIterator(NamedState('a'))
+    state_iterator.scored_moves = [(5, 'x'), (3, 'y'), (3, 'z'), (1, 'w')]
+    for heuristic, move in [(3, 'm'), (6, 'first'), (0, 'last'), (2, 'n')]:
+        state_iterator.add_move(heuristic, move)
+    # decreasing heuristic, a move put back goes after the moves with the same heuristic
+    assert state_iterator.scored_moves == [(6, 'first'), (5, 'x'), (3, 'y'), (3, 'z'), (3, 'm'), (2, 'n'), (1, 'w'),
+                                           (0, 'last')]
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+import solvers.priority_solver as priority_solver
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import PrioritySolver
+from solvers.priority_solver import CrosswordQueueState
+
+
+def initial_grid_state(size, num_candidates, noise):
+    grid_states = []
+    solver = PrioritySolver(clue_model_type='oracle', load_candidates=False,
+                            clue_model_kwargs={'num_candidates_per_entry': num_candidates, 'noise': noise})
+    solver._solver = lambda grid_state: grid_states.append(grid_state) or grid_state
+    np.random.seed(0)
+    solver.solve_puz(make_puzzle(size, 0))
+    return grid_states[0]
+
+
+@pytest.mark.parametrize('max_excluded', [None, 2])
+def test_vectorized_scores_match_scalar(monkeypatch, max_excluded):
+    grid_state = initial_grid_state(9, 20, 0.2)
+    for _ in range(4):
+        sequences = []
+        for threshold in [0, float('inf')]:
+            monkeypatch.setattr(priority_solver, 'VECTORIZE_MIN_CANDIDATES', threshold)
+            sequences.append(list(CrosswordQueueState(grid_state, max_excluded)._scored_moves()))
+        vectorized, scalar = sequences
+        assert vectorized and vectorized == scalar
+        assert all(type(value) is type(scalar_value) for (value, _), (scalar_value, _) in zip(vectorized, scalar))
+
+        # follow the best move, so states with filled cells and excluded entries are compared too
+        for _, (word, entry) in sorted(scalar, key=lambda x: x[0]):
+            new_grid_state = grid_state.place(word, entry, max_excluded)
+            if new_grid_state is not None:
+                grid_state = new_grid_state
+                break
@@ -0,0 +1,67 @@
+from solvers.grid_state import GridState, make_letter_masks, make_entry_slices
+
+# 2x2 grid of white cells: across entries in rows 0 and 1, down entries in columns 0 and 1
+ENTRIES = [('A', 0, 0), ('A', 1, 0), ('D', 0, 0), ('D', 0, 1)]
+CROSSINGS = {('A', 0, 0): [(('D', 0, 0), 0, 0), (('D', 0, 1), 1, 0)],
+             ('A', 1, 0): [(('D', 0, 0), 0, 1), (('D', 0, 1), 1, 1)],
+             ('D', 0, 0): [(('A', 0, 0), 0, 0), (('A', 1, 0), 1, 0)],
+             ('D', 0, 1): [(('A', 0, 0), 0, 1), (('A', 1, 0), 1, 1)]}
+
+
+def grid_state(candidates):
+    """
+    empty 2x2 grid with given candidates of the entries (in order of ENTRIES)
+    """
+    all_candidates = dict(zip(ENTRIES, candidates))
+    lengths = {entry: 2 for entry in ENTRIES}
+    return GridState(bytearray(b'----'), 2, {entry: (1 << len(cands)) - 1 for entry, cands in all_candidates.items()},
+                     all_candidates, CROSSINGS, make_letter_masks(all_candidates, lengths),
+                     make_entry_slices(2, lengths))
+
+
+def domains(state):
+    return {entry: [word for i, word in enumerate(state.all_candidates[entry]) if mask >> i & 1]
+            for entry, mask in state.remaining_candidates.items()}
+
+
+def test_removes_unsupported_candidates():
+    # 'xy' and 'zz' are unsupported by both of their crossings, 'aq' by one
+    state = grid_state([['ab', 'xy', 'aq'], ['cd'], ['ac'], ['bd', 'zz']])
+    assert state.propagate(ENTRIES, 0)
+    assert domains(state) == {('A', 0, 0): ['ab'], ('A', 1, 0): ['cd'], ('D', 0, 0): ['ac'], ('D', 0, 1): ['bd']}
+
+    # with a budget of one more excluded entry, a candidate excluding a single crossing is kept
+    state = grid_state([['ab', 'xy', 'aq'], ['cd'], ['ac'], ['bd', 'zz']])
+    assert state.propagate(ENTRIES, 1)
+    assert domains(state)[('A', 0, 0)] == ['ab', 'aq'] and domains(state)[('D', 0, 1)] == ['bd']
+
+    state = grid_state([['ab', 'xy', 'aq'], ['cd'], ['ac'], ['bd', 'zz']])
+    assert state.propagate(ENTRIES, 2)
+    assert domains(state)[('A', 0, 0)] == ['ab', 'xy', 'aq'] and domains(state)[('D', 0, 1)] == ['bd', 'zz']
+
+
+def test_removals_propagate():
+    # removing 'xq' (unsupported by A10) leaves 'xb' unsupported by D00
+    state = grid_state([['ab', 'xb'], ['cd'], ['ac', 'xq'], ['bd']])
+    assert state.propagate([('A', 1, 0)], 0)
+    assert domains(state) == {('A', 0, 0): ['ab'], ('A', 1, 0): ['cd'], ('D', 0, 0): ['ac'], ('D', 0, 1): ['bd']}
+
+    state = grid_state([['ab', 'xb'], ['cd'], ['ac', 'xq'], ['bd']])
+    assert state.propagate([('A', 1, 0)], 1)
+    assert domains(state)[('A', 0, 0)] == ['ab', 'xb'] and domains(state)[('D', 0, 0)] == ['ac', 'xq']
+
+
+def test_exclusions_count_against_budget():
+    # no candidate of A10 is supported, so it is excluded
+    state = grid_state([['ab'], ['ee'], ['ac'], ['bd']])
+    assert not state.propagate(ENTRIES, 0)
+
+    state = grid_state([['ab'], ['ee'], ['ac'], ['bd']])
+    assert state.propagate(ENTRIES, 1)
+    assert ('A', 1, 0) not in state.remaining_candidates and state.num_excluded == 1
+    # A10 no longer constrains its crossings
+    assert domains(state) == {('A', 0, 0): ['ab'], ('D', 0, 0): ['ac'], ('D', 0, 1): ['bd']}
+
+    # without a limit nothing is propagated
+    state = grid_state([['ab'], ['ee'], ['ac'], ['bd']])
+    assert state.propagate(ENTRIES, None) and state.num_excluded == 0
@@ -0,0 +1,20 @@
+from itertools import islice
+
+import pytest
+
+from solvers.restarts import luby, restart_cutoffs
+
+
+def test_luby_sequence():
+    assert [luby(i) for i in range(1, 16)] == [1, 1, 2, 1, 1, 2, 4, 1, 1, 2, 1, 1, 2, 4, 8]
+
+
+def test_restart_cutoffs():
+    assert list(islice(restart_cutoffs('luby', base=10), 7)) == [10, 10, 20, 10, 10, 20, 40]
+    assert list(islice(restart_cutoffs('geometric', base=10, factor=2), 4)) == [10, 20, 40, 80]
+    assert list(islice(restart_cutoffs('geometric', base=10, factor=1.5), 4)) == [10, 15, 22, 33]
+
+
+def test_unknown_schedule():
+    with pytest.raises(ValueError):
+        restart_cutoffs('constant')
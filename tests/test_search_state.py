@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver
+from solvers.grid_state import GridState, iter_bits, popcount
+from solvers.search_state import SearchState
+
+
+def initial_grid_state(size, noise):
+    grid_states = []
+    solver = BacktrackSolver(clue_model_type='oracle', load_candidates=False, clue_model_kwargs={'noise': noise})
+    solver._solver = lambda grid_state: grid_states.append(grid_state) or grid_state
+    np.random.seed(0)
+    solver.solve_puz(make_puzzle(size, 0))
+    return grid_states[0]
+
+
+def snapshot(state):
+    # ties in the entry order can come back in a different order after undo, only the buckets are compared
+    return (dict(state.remaining_candidates), bytes(state.cells), state.num_excluded, state.num_empty, state.node_key,
+            dict(state.entry_order.sizes))
+
+
+def check_hashes(state):
+    # incremental hashes and entry order match the ones computed from scratch
+    assert state.zobrist_hash == GridState(bytearray(state.cells), state.width, {}, {}, None, None, None,
+                                           zobrist_table=state.zobrist_table).zobrist_hash
+    decided_hash = 0
+    for entry in state.all_candidates:
+        if entry not in state.remaining_candidates:
+            decided_hash ^= state.zobrist_table[entry]
+    assert state.decided_hash == decided_hash
+    assert state.entry_order.sizes == {entry: popcount(mask) for entry, mask in state.remaining_candidates.items()}
+
+
+@pytest.mark.parametrize('seed, slack', [(0, None), (1, 6), (2, 10)])
+def test_undo_restores_state(seed, slack):
+    rng = random.Random(seed)
+    state = SearchState(initial_grid_state(9, 0.3))
+    # with a small slack over the initial number of excluded entries, many placements fail
+    max_excluded = None if slack is None else state.num_excluded + slack
+    snapshots = [snapshot(state)]
+    num_changes = num_failures = 0
+    for _ in range(300):
+        if state.depth and rng.random() < 0.3:
+            state.undo()
+            snapshots.pop()
+        else:
+            entries = list(state.remaining_candidates)
+            if not entries:
+                continue
+            entry = rng.choice(entries)
+            before = snapshot(state)
+            if rng.random() < 0.2:
+                ok = state.exclude(entry, max_excluded)
+            else:
+                cand_idx = rng.choice(list(iter_bits(state.remaining_candidates[entry])))
+                ok = state.place(state.all_candidates[entry][cand_idx], entry, max_excluded)
+            if ok:
+                snapshots.append(snapshot(state))
+                num_changes += 1
+            else:
+                # a failed place or exclude leaves the state unchanged
+                assert snapshot(state) == before
+                num_failures += 1
+        assert state.depth == len(snapshots) - 1
+        assert snapshot(state) == snapshots[-1]
+        check_hashes(state)
+    assert num_changes > 30 and (slack is None or num_failures > 0)
+
+    # undo back to the start
+    while state.depth:
+        state.undo()
+        snapshots.pop()
+        assert snapshot(state) == snapshots[-1]
+    check_hashes(state)
+
+
+def test_node_key_depends_on_cells_and_decided_entries():
+    state = SearchState(initial_grid_state(9, 0.))
+    keys = {state.node_key}
+    entry = next(iter(state.remaining_candidates))
+    state.checkpoint()
+    state.set_candidates(entry, None)
+    keys.add(state.node_key)
+    state.undo()
+    assert state.node_key in keys
+    state.place(state.all_candidates[entry][0], entry)
+    keys.add(state.node_key)
+    assert len(keys) == 3
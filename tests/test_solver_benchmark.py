@@ -0,0 +1,12 @@
+import pytest
+
+from benchmarks.solver_benchmark import run_case
+
+
+@pytest.mark.parametrize('solver_name', ['backtrack', 'priority', 'local'])
+def test_complete_cases_have_time_to_fill(solver_name):
+    # without noise every solver solves a small grid
+    result = run_case(solver_name, 5, 5, 0., 0, 10)
+    assert result['solved']
+    assert result['time_to_fill'] is not None
+    assert 0 <= result['time_to_fill'] <= result['time']
@@ -0,0 +1,55 @@
+import json
+import re
+
+import numpy as np
+import pytest
+
+import solvers.stats
+from benchmarks.solver_benchmark import make_puzzle
+from solvers import BacktrackSolver, PrioritySolver, LocalSearchSolver
+from solvers.budget import SearchBudget
+from solvers.stats import SearchStats
+
+PROGRESS_FIELDS = {BacktrackSolver: {'k', 'depth', 'value'},
+                   PrioritySolver: {'depth', 'queue_size', 'visited', 'value'},
+                   LocalSearchSolver: {'value', 'cost', 'excluded'}}
+# solver options that turn on the optional parts of each search
+SOLVER_KWARGS = {BacktrackSolver: {'backjump': True, 'restarts': 'luby', 'seed': 0},
+                 PrioritySolver: {'max_frontier': 5},
+                 LocalSearchSolver: {}}
+
+
+def documented_counters():
+    doc = solvers.stats.__doc__
+    section = doc[doc.index('counters (names'):doc.index('expansions per depth')]
+    return {name for line in section.splitlines()[1:] for name in re.findall(r'\w+', line.split(':')[0])}
+
+
+@pytest.mark.parametrize('solver_class', [BacktrackSolver, PrioritySolver, LocalSearchSolver])
+def test_trace(tmp_path, solver_class):
+    path = tmp_path / 'trace.jsonl'
+    stats = SearchStats(trace_path=str(path), trace_freq=1)
+    solver = solver_class(clue_model_type='oracle', load_candidates=False, stats=stats,
+                          clue_model_kwargs={'noise': 0.3}, **SOLVER_KWARGS[solver_class])
+    np.random.seed(0)
+    solver.solve_puz(make_puzzle(9, 0), budget=SearchBudget(max_nodes=200))
+    stats.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    start, progress, end = records[0], records[1:-1], records[-1]
+    assert set(start) == {'event', 'time', 'solver', 'width', 'height'} and start['event'] == 'start'
+    assert progress and all(record['event'] == 'progress' and
+                            set(record) == {'event', 'time', 'iters', 'counts'} | PROGRESS_FIELDS[solver_class]
+                            for record in progress)
+    assert set(end) == {'event', 'time', 'value', 'stop_reason', 'counts', 'expansions', 'timers'}
+    assert end['event'] == 'end' and set(end['timers']) == {'clue_model', 'setup', 'search'}
+    assert set(end['counts']) <= documented_counters()
+
+
+def test_documented_counters_are_used():
+    used = set()
+    for module in ['backtrack_solver', 'priority_search', 'local_search_solver', 'grid_state', 'search_state',
+                   'propagation']:
+        with open(f'{solvers.stats.__file__[:-len("stats.py")]}{module}.py') as f:
+            used.update(re.findall(r"stats\.count\('(\w+)'", f.read()))
+    assert used == documented_counters()
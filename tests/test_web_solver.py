@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from clue_models.web_solver import TokenBucket, WebSolver
+
+PAGE = '<a href="/crossword-clues/hello">hello</a> <a href="/crossword-clues/world">world</a>'
+ENTRY = {'cell': 0, 'AD': 'A', 'length': 5, 'clue': 'Greeting?'}
+
+
+@pytest.fixture
+def server():
+    """
+    local server answering with the statuses in server.statuses (200 with PAGE once they run out)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            httpd.requests += 1
+            status = httpd.statuses.pop(0) if httpd.statuses else 200
+            body = (PAGE if status == 200 else 'error').encode()
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.statuses, httpd.requests = [], 0
+    httpd.url = f'http://127.0.0.1:{httpd.server_address[1]}/'
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def solve(server, monkeypatch):
+    monkeypatch.setattr(WebSolver, 'RETRY_DELAY', 0)
+    return WebSolver([ENTRY], 'test', load=False, cache=False, base_url=server.url, rate=1000, max_retries=2)
+
+
+def test_candidates(server, monkeypatch):
+    solver = solve(server, monkeypatch)
+    assert solver.candidates == {0: ['HELLO', 'WORLD']}
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_error_status_is_retried(server, monkeypatch, status):
+    server.statuses = [status]
+    solver = solve(server, monkeypatch)
+    assert solver.candidates == {0: ['HELLO', 'WORLD']} and server.requests == 2 and not solver.banned
+
+
+@pytest.mark.parametrize('status, banned', [(429, True), (503, True), (500, False), (404, False)])
+def test_error_status_after_retries(server, monkeypatch, status, banned):
+    server.statuses = [status] * 3
+    solver = solve(server, monkeypatch)
+    # the error is not stored as an empty answer, so the clue is looked up again next time
+    assert solver.candidates == {0: []} and server.requests == 3 and solver.banned == banned
+    assert solve(server, monkeypatch).candidates == {0: ['HELLO', 'WORLD']}
+
+
+def test_token_bucket_burst_then_rate():
+    async def run():
+        bucket = TokenBucket(rate=100, capacity=5, min_rate=1)
+        start = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        burst = time.monotonic() - start
+        for _ in range(10):
+            await bucket.acquire()
+        return burst, time.monotonic() - start
+    burst, total = asyncio.run(run())
+    assert burst < 0.05 and 0.08 < total < 0.5
+
+
+def test_token_bucket_back_off_and_recover():
+    bucket = TokenBucket(rate=8, capacity=5, min_rate=1, backoff_factor=0.5, recover_step=0.5)
+    bucket.back_off()
+    assert bucket.rate == 4 and bucket.tokens <= 0
+    for _ in range(3):
+        bucket.back_off()
+    assert bucket.rate == 1
+    for _ in range(20):
+        bucket.recover()
+    assert bucket.rate == 8
@@ -11,6 +11,8 @@ class BoardGUI:
         self.board_w, self.board_h = w, h - 2*self.board_data.CLUE_HEIGHT
         self.rows, self.cols = p.height, p.width
         self.board = [[p.fill[r * p.width + c] for c in range(p.width)] for r in range(p.height)] if board is None else board
+        # cells filled in by the user (or already in the puzzle), kept fixed when solving again (see user_fill)
+        self.user_cells = {i for i, l in enumerate(p.fill) if l not in ['.', '-']}
 
         # get clue information
         numbering = p.clue_numbering()
@@ -65,7 +67,12 @@ class BoardGUI:
                 if box.just_entered_letter:
                     box.just_entered_letter = False
                     just_entered_letter = True
-                    self.board[i // self.rows][i % self.cols] = box.text
+                    self.board[i // self.cols][i % self.cols] = box.text
+                    self.user_cells.add(i)
+                if box.just_deleted_letter:
+                    box.just_deleted_letter = False
+                    self.board[i // self.cols][i % self.cols] = '-'
+                    self.user_cells.discard(i)
 
         if just_entered_letter:
             self.input_boxes[self.cols * self.active_r + self.active_c].active = False
@@ -105,6 +112,24 @@ class BoardGUI:
         self.update_active_word()
 
 
+    def user_fill(self):
+        """
+        returns grid as list of rows with only the letters filled in by the user, '-' elsewhere
+        """
+        return [[l if l == '.' or r * self.cols + c in self.user_cells else '-' for c, l in enumerate(row)]
+                for r, row in enumerate(self.board)]
+
+    def set_board(self, board):
+        """
+        shows new board (list of rows), eg a solution found after the user changed some cells
+        """
+        self.board = [list(row) for row in board]
+        for i, box in enumerate(self.input_boxes):
+            l = self.board[i // self.cols][i % self.cols]
+            if l != '.':
+                box.text = '' if l == '-' else l.upper()
+                box.txt_surface = self.board_data.GRID_FONT.render(box.text, True, self.board_data.COLOR_TEXT)
+
     def shift_active(self, dr, dc):
         self.active_r += dr
         self.active_c += dc
@@ -186,6 +211,7 @@ class InputBox:
         self.active = False
         self.inactiveword = False
         self.just_entered_letter = False
+        self.just_deleted_letter = False
 
 
     def handle_event(self, event):
@@ -201,6 +227,7 @@ class InputBox:
             if self.active:
                 if event.key == pg.K_BACKSPACE:
                     self.text = ''
+                    self.just_deleted_letter = True
                 else:
                     text_input = event.unicode.upper()
                     if text_input.isalpha():
@@ -3,8 +3,7 @@ import os
 import pandas as pd
 from sklearn.model_selection import train_test_split
 
-# string appearing between clue and answer, used to prime language model
-JOIN_STRING = ' is the answer to: '
+from utils.constants import JOIN_STRING
 
 def get_clues(filename):
     p = puz.read(filename)
@@ -0,0 +1,6 @@
+"""
+constants shared by training data scraping and the clue models, kept free of heavy imports
+"""
+
+# string appearing between clue and answer, used to prime language model
+JOIN_STRING = ' is the answer to: '